@@ -2,21 +2,46 @@
 
 from utils import Utils
 from drift import Drift
+from executor import Executor, ExecutionResult
+from plan import Plan, PlanItem, Planner
+from connection import ConnectionManager
 from errors import (
     DefinitionKeyError,
+    DefinitionLoadError,
     FileError,
     TemplateFileError,
     DependencyError,
     SQLExecutionError,
+    ExecutionError,
+    PlanningError,
+    PlanError,
+    AlterError,
+    ReadinessError,
+    GitError,
+    SelectorError,
     )
 
 __all__ = [
     "Utils",
     "Drift",
+    "Executor",
+    "ExecutionResult",
+    "Plan",
+    "PlanItem",
+    "Planner",
+    "ConnectionManager",
     "DefinitionKeyError",
+    "DefinitionLoadError",
     "FileError",
     "TemplateFileError",
     "DependencyError",
     "SQLExecutionError",
+    "ExecutionError",
+    "PlanningError",
+    "PlanError",
+    "AlterError",
+    "ReadinessError",
+    "GitError",
+    "SelectorError",
     ]
 __version__ = "1.0.0"
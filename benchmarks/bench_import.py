@@ -0,0 +1,138 @@
+"""Benchmark of the import time of the pipeline.
+
+This module provides:
+- import_times: function that measures the import of a module with `python -X importtime`;
+- compare: function that reports the modules slower to import than in a previous result;
+- main: command line entry point.
+
+Usage:
+    python benchmarks/bench_import.py --output imports.json
+    python benchmarks/bench_import.py --output new.json --compare imports.json
+    python benchmarks/bench_import.py --max-ms 150
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose import is measured, the entry point first.
+MODULES = ("main", "utils", "plan", "drift", "executor", "errors")
+
+# Dependencies the pipeline modules import lazily, reported when they are imported anyway.
+HEAVY_MODULES = ("sqlalchemy", "cryptography", "sqlparse", "jinja2", "rich")
+
+
+def import_times(module: str) -> tuple[float, dict[str, float]]:
+    """Import a module in a fresh interpreter with `-X importtime`.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        tuple: The cumulative import time of the module in milliseconds, and
+            the cumulative time of the heavy modules it imported.
+
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total = 0.0
+    heavy: dict[str, float] = {}
+    # Lines read "import time: self [us] | cumulative | imported package".
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if name == module:
+            total = int(cumulative) / 1000
+        elif name in HEAVY_MODULES:
+            heavy[name] = int(cumulative) / 1000
+    return total, heavy
+
+
+def compare(previous: dict, current: dict, threshold: float) -> list[str]:
+    """Compare the import times with a previous result.
+
+    Args:
+        previous (dict): The previous benchmark result.
+        current (dict): The current benchmark result.
+        threshold (float): Ratio of the previous time above which an import is a regression.
+
+    Returns:
+        list: Description of every regression.
+
+    """
+    regressions = []
+    for module, measure in current["modules"].items():
+        before = previous["modules"].get(module)
+        if before is None:
+            continue
+        ratio = measure["ms"] / before["ms"] if before["ms"] else 1.0
+        line = f"{module:<12} {before['ms']:>8.1f}ms {measure['ms']:>8.1f}ms {ratio:>6.2f}x"
+        print(line)  # noqa: T201
+        if ratio > threshold:
+            regressions.append(line)
+    return regressions
+
+
+def main() -> int:
+    """Run the benchmark, write its result and check it against a budget or a previous one."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Imports of each module, the median is kept.")
+    parser.add_argument("--output", help="Path of the JSON result.")
+    parser.add_argument("--compare", help="Path of a previous JSON result to compare with.")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Slowdown ratio reported as a regression.")
+    parser.add_argument("--max-ms", type=float, help="Import time budget of the entry point in milliseconds.")
+    args = parser.parse_args()
+
+    modules = {}
+    failed = False
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        heavy = sorted({name for _, imported in runs for name in imported})
+        modules[module] = {"ms": round(statistics.median(ms for ms, _ in runs), 3), "heavy": heavy}
+        print(f"{module:<12} {modules[module]['ms']:>8.1f}ms {', '.join(heavy)}")  # noqa: T201
+        if heavy:
+            print(f"{module} imports {', '.join(heavy)} at load, import them where they are used.")  # noqa: T201
+            failed = True
+
+    current = {
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "modules": modules,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    if args.max_ms is not None and modules[MODULES[0]]["ms"] > args.max_ms:
+        print(f"{MODULES[0]} takes {modules[MODULES[0]]['ms']:.1f}ms to import, over {args.max_ms}ms.")  # noqa: T201
+        failed = True
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), current, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} import(s) slower than {args.threshold}x:")  # noqa: T201
+            print("\n".join(regressions))  # noqa: T201
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
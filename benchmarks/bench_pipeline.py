@@ -0,0 +1,310 @@
+"""Benchmark of the planning pipeline.
+
+This module provides:
+- generate_definitions: function that writes synthetic table definitions with a realistic dependency shape;
+- run_pipeline: function that runs the pipeline phases against an in-memory SQLite database;
+- compare: function that reports the phases slower than in a previous result;
+- main: command line entry point.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 100,1000,10000 --output bench.json
+    python benchmarks/bench_pipeline.py --output new.json --compare bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tomllib
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from drift import Drift  # noqa: E402
+from main import InputConfig, apply_plan  # noqa: E402
+from output import Output  # noqa: E402
+from plan import Planner  # noqa: E402
+from utils import Utils  # noqa: E402
+
+# Resources written in each definition file.
+RESOURCES_PER_FILE = 500
+
+# Share of the tables without dependencies, the sources of the graph.
+SOURCE_SHARE = 0.1
+
+# Tables depend on tables defined shortly before them, as models of the same domain do.
+DEPENDENCY_WINDOW = 200
+
+
+@dataclass
+class PhaseResult:
+    """Time and peak memory of a phase."""
+    seconds: float
+    peak_mb: float | None = None
+
+
+@dataclass
+class SizeResult:
+    """Phases of a pipeline run over a number of resources."""
+    size: int
+    phases: dict[str, PhaseResult] = field(default_factory=dict)
+    counts: dict[str, int] = field(default_factory=dict)
+
+
+@contextmanager
+def phase(result: SizeResult, name: str, *, memory: bool):
+    """Measure the time and the peak memory of a phase."""
+    if memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    peak_mb = tracemalloc.get_traced_memory()[1] / 2**20 if memory else None
+    result.phases[name] = PhaseResult(seconds=round(seconds, 6), peak_mb=peak_mb and round(peak_mb, 3))
+
+
+def generate_definitions(path: str, size: int, seed: int = 0) -> None:
+    """Write synthetic table definitions.
+
+    A share of the tables are sources without dependencies, every other table
+    depends on one to three tables defined shortly before it, so the graph is
+    deep and wide like layered models.
+
+    Args:
+        path (str): Folder of the definition files.
+        size (int): Number of tables.
+        seed (int): Seed of the dependency shape, the same seed gives the same graph.
+
+    """
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+
+    for start in range(0, size, RESOURCES_PER_FILE):
+        lines = []
+        for i in range(start, min(start + RESOURCES_PER_FILE, size)):
+            dependencies = []
+            if i > 0 and rng.random() > SOURCE_SHARE:
+                window = range(max(0, i - DEPENDENCY_WINDOW), i)
+                dependencies = sorted(rng.sample(window, k=min(len(window), rng.randint(1, 3))))
+
+            depends_on = ", ".join(f'"t{d}"' for d in dependencies)
+            lines.extend([
+                "[[table]]",
+                f'name = "t{i}"',
+                'database = "main"',
+                'schema = "main"',
+                'owner = "sqlite"',
+                f"depends_on = {{table = [{depends_on}]}}" if dependencies else "depends_on = {}",
+            ])
+            for column, column_type in [("id", "INTEGER"), ("name", "TEXT"), ("amount", "REAL")]:
+                lines.extend([
+                    "[[table.columns]]",
+                    f'name = "{column}"',
+                    f'type = "{column_type}"',
+                    "nullable = true",
+                    'default = ""',
+                ])
+            lines.append("")
+
+        with open(os.path.join(path, f"tables_{start // RESOURCES_PER_FILE:04d}.toml"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+
+
+def run_pipeline(size: int, *, memory: bool = True, bulk: bool = True, seed: int = 0) -> SizeResult:
+    """Run the pipeline phases over synthetic definitions, against an in-memory SQLite database.
+
+    Args:
+        size (int): Number of tables.
+        memory (bool): Trace the peak memory of every phase, slows down the run.
+        bulk (bool): Fetch the state of the tables with the bulk state query.
+        seed (int): Seed of the dependency shape.
+
+    Returns:
+        SizeResult: Time and peak memory of every phase.
+
+    """
+    result = SizeResult(size=size)
+    resources_path = os.path.join(ROOT, "resources.toml")
+    with open(resources_path, "rb") as f:
+        db_sys_resources = tomllib.load(f)["sqlite"]["resources"]
+    if not bulk:
+        db_sys_resources["table"] = {
+            k: v for k, v in db_sys_resources["table"].items() if k != "bulk_state_query"
+        }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        definitions_path = os.path.join(tmp, "definitions")
+
+        with phase(result, "generate", memory=memory):
+            generate_definitions(definitions_path, size, seed)
+
+        utils = Utils(definitions_path=definitions_path, resources_path=resources_path)
+        # The per-statement console output is not part of the measure.
+        utils.output = Output(mode="compact", stream=io.StringIO())
+
+        with phase(result, "dependencies_map", memory=memory):
+            d_map = utils.dependencies_map()
+
+        with phase(result, "dependencies_sort", memory=memory):
+            sorted_map = utils.dependencies_sort(d_map)
+
+        engine = create_engine("sqlite://")
+        with engine.connect() as conn:
+            planner = Planner(utils=utils, db_sys_resources=db_sys_resources, run_mode="create-or-update")
+
+            # Every table is new, the drift check and the create template of each one.
+            with phase(result, "plan", memory=memory):
+                plan = planner.build(sorted_map=sorted_map, d_map=d_map, drift=Drift(conn=conn))
+
+            config = InputConfig(
+                workspace=tmp,
+                database_system="sqlite",
+                definitions_path=definitions_path,
+                resources_path=resources_path,
+                dry_run=False,
+                run_mode="create-or-update",
+            )
+            with phase(result, "apply", memory=memory):
+                apply_plan(plan=plan, conn=conn, utils=utils, config=config)
+
+            # Compare every definition with the state of the created table.
+            drift = Drift(conn=conn)
+            with phase(result, "drift", memory=memory):
+                planner.load_state_snapshots(drift, {"table"})
+                actions: dict[str, int] = {}
+                for node in sorted_map:
+                    name = node.split("::")[1]
+                    state_query = None
+                    if not bulk:
+                        state_query = utils.render_templates(
+                            template=db_sys_resources["table"]["state_query"],
+                            name=name,
+                            definition=utils.definitions_index[node],
+                        )
+                    state = drift.resource_state(
+                        definition=utils.definitions_index[node],
+                        state_query=state_query,
+                        name=name,
+                        resource_type="table",
+                    )
+                    actions[state["iac_action"]] = actions.get(state["iac_action"], 0) + 1
+
+        result.counts = {
+            "resources": len(sorted_map),
+            "edges": sum(len(dependencies) for dependencies in d_map.values()),
+            "statements": len(plan.changes()),
+            **{f"drift_{action}": count for action, count in sorted(actions.items())},
+        }
+
+    return result
+
+
+def compare(previous: dict, current: dict, threshold: float) -> list[str]:
+    """Compare the phase times with a previous result.
+
+    Args:
+        previous (dict): The previous benchmark result.
+        current (dict): The current benchmark result.
+        threshold (float): Ratio of the previous time above which a phase is a regression.
+
+    Returns:
+        list: Description of every regression.
+
+    """
+    regressions = []
+    previous_sizes = {r["size"]: r for r in previous["results"]}
+    for result in current["results"]:
+        before = previous_sizes.get(result["size"])
+        if before is None:
+            continue
+        for name, measure in result["phases"].items():
+            if name not in before["phases"]:
+                continue
+            old = before["phases"][name]["seconds"]
+            ratio = measure["seconds"] / old if old else 1.0
+            line = f"{result['size']:>8} {name:<20} {old:>10.4f}s {measure['seconds']:>10.4f}s {ratio:>6.2f}x"
+            print(line)  # noqa: T201
+            if ratio > threshold:
+                regressions.append(line)
+    return regressions
+
+
+def git_commit() -> str | None:
+    """Commit of the benchmarked tree, None outside of a git repository."""
+    try:
+        return subprocess.run(
+            ["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    """Run the benchmark, write its result and compare it with a previous one."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="Numbers of resources, separated by commas.")
+    parser.add_argument("--output", help="Path of the JSON result.")
+    parser.add_argument("--compare", help="Path of a previous JSON result to compare with.")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio reported as a regression.")
+    parser.add_argument("--no-memory", action="store_true", help="Do not trace the peak memory, for exact times.")
+    parser.add_argument("--no-bulk", action="store_true", help="Query the state of every resource on its own.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the dependency shape.")
+    args = parser.parse_args()
+
+    memory = not args.no_memory
+    if memory:
+        tracemalloc.start()
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = run_pipeline(size, memory=memory, bulk=not args.no_bulk, seed=args.seed)
+        results.append({
+            "size": result.size,
+            "phases": {name: vars(measure) for name, measure in result.phases.items()},
+            "counts": result.counts,
+        })
+        phases = " ".join(f"{name}={measure.seconds:.3f}s" for name, measure in result.phases.items())
+        print(f"{size:>8} resources: {phases}")  # noqa: T201
+
+    current = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "memory_traced": memory,
+        "bulk_state": not args.no_bulk,
+        "seed": args.seed,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), current, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} phase(s) slower than {args.threshold}x:")  # noqa: T201
+            print("\n".join(regressions))  # noqa: T201
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
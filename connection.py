@@ -0,0 +1,125 @@
+"""Database connections of the pipeline run.
+
+This module provides:
+- ConnectionManager: pooled engine of the database system, handing out the connections of the run;
+- PoolStats: time spent waiting for a connection of the pool.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from tracing import TRACER
+
+if TYPE_CHECKING:
+    from sqlalchemy import Connection, Engine
+
+    from utils import Utils
+
+# Seconds after which a pooled connection is replaced, before the database closes idle sessions.
+POOL_RECYCLE = 1800
+
+# Seconds to wait for a free connection before failing, the pool is sized so this is rare.
+POOL_TIMEOUT = 60
+
+# Connect arguments keeping the sessions of a long run alive, by database system.
+KEEPALIVE_ARGS = {
+    "snowflake": {"client_session_keep_alive": True},
+}
+
+
+@dataclass
+class PoolStats:
+    """Connections handed out by the pool and the time spent waiting for them."""
+    checkouts: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        """Stats of the pool, with the mean wait."""
+        return {
+            "checkouts": self.checkouts,
+            "wait_seconds": round(self.wait_seconds, 6),
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+            "mean_wait_seconds": round(self.wait_seconds / self.checkouts, 6) if self.checkouts else 0.0,
+        }
+
+
+class ConnectionManager:
+    """One engine per run, its connections are pooled and reused by the workers.
+
+    The engine arguments, including the private key decoded to DER, are
+    loaded once. The pool holds one connection per worker and one for the
+    main thread, connections are checked with a ping before being handed
+    out and replaced after `POOL_RECYCLE` seconds. Closing a connection
+    returns it to the pool.
+    """
+
+    def __init__(self, utils: Utils, database_system: str, concurrency: int = 1):
+        """Prepare the engine, opened on the first connection.
+
+        Args:
+            utils (Utils): Loads the engine arguments of the database system.
+            database_system (str): The database system, e.g. "snowflake" or "sqlite".
+            concurrency (int): Number of workers using a connection at the same time.
+
+        """
+        self.utils = utils
+        self.database_system = database_system
+        self.pool_size = max(1, concurrency) + 1
+        self.stats = PoolStats()
+        self._engine: Engine | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self) -> Engine:
+        """The pooled engine, created once."""
+        with self._lock:
+            if self._engine is None:
+                self._engine = self._create_engine()
+            return self._engine
+
+    def _create_engine(self) -> Engine:
+        from sqlalchemy import create_engine  # noqa: PLC0415
+
+        url, connect_args = self.utils.engine_arguments(self.database_system)
+        connect_args = {**KEEPALIVE_ARGS.get(self.database_system, {}), **connect_args}
+
+        if url.startswith("sqlite"):
+            # SQLite uses its own pool classes, they take none of the queue pool arguments.
+            return create_engine(url, connect_args=connect_args, echo=False)
+
+        return create_engine(
+            url,
+            connect_args=connect_args,
+            echo=False,
+            pool_size=self.pool_size,
+            max_overflow=0,
+            pool_timeout=POOL_TIMEOUT,
+            pool_recycle=POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+
+    def connect(self) -> Connection:
+        """Check out a connection of the pool, recording the time waited for it."""
+        engine = self.engine
+        start = time.perf_counter()
+        with TRACER.span("checkout", "connect"):
+            conn = engine.connect()
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self.stats.checkouts += 1
+            self.stats.wait_seconds += waited
+            self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+        return conn
+
+    def dispose(self) -> None:
+        """Close every pooled connection, the next connection opens a new engine."""
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
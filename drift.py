@@ -6,6 +6,7 @@ Drift is the term for when the real-world state of your infrastructure differs f
 
 from __future__ import annotations
 
+import hashlib
 import json
 from typing import Any, TYPE_CHECKING
 from dataclasses import dataclass, field
@@ -15,6 +16,10 @@ from collections.abc import MutableMapping, MutableSequence
 if TYPE_CHECKING:
     from sqlalchemy import Connection
 
+# Part of the error of SHOW GRANTS TO ROLE for a role not created yet,
+# "Role 'X' does not exist or not authorized." on Snowflake.
+ROLE_NOT_FOUND = "does not exist"
+
 @dataclass
 class CheckResult:
     """Result of a drift check.
@@ -29,13 +34,25 @@ class CheckResult:
 class Drift:
     """Drift check of the database resource."""
 
-    def __init__(self, conn:Connection) -> dict:
+    def __init__(
+        self,
+        conn:Connection,
+        state_snapshots:dict | None = None,
+        role_grants:dict | None = None,
+        snapshot_databases:dict | None = None,
+    ) -> dict:
         """Initialize the comparator with Snowflake connection parameters and YAML definitions file path.
 
         Args:
             conn(Connection): SQL database connection.
+            state_snapshots(dict, optional): States already fetched in bulk, keyed by resource type, database, schema and name.
+            role_grants(dict, optional): Grants already fetched in bulk, keyed by role.
+            snapshot_databases(dict, optional): Databases of the states fetched in bulk, keyed by resource type.
         """
         self.conn = conn
+        self.state_snapshots = state_snapshots if state_snapshots is not None else {}
+        self.role_grants = role_grants if role_grants is not None else {}
+        self.snapshot_databases = snapshot_databases if snapshot_databases is not None else {}
 
     def __clean_value(self, value:Any) -> Any:
         """Clean and normalize a value."""
@@ -98,6 +115,11 @@ class Drift:
 
         return clean_rcs_def
 
+    def definition_fingerprint(self, definition:dict) -> str:
+        """Content hash of the normalized resource definition."""
+        rsc_def = self._normalize_definition(definition)
+        return hashlib.sha256(json.dumps(rsc_def, sort_keys=True, default=str).encode()).hexdigest()
+
     def _fetch_state_query(self, query:str) -> dict:
         """Fetch the resource state query as a dictionary."""
         try:
@@ -109,6 +131,122 @@ class Drift:
         else:
             return None
 
+    def _snapshot_key(self, name:str, database:str | None = None, schema:str | None = None) -> tuple:
+        """Normalize a resource name, with its database and schema, for the state snapshot lookup."""
+        return tuple(str(part).upper().strip() if part else "" for part in (database, schema, name))
+
+    def _role_key(self, role:str) -> str:
+        """Normalize a role name for the role grants lookup."""
+        return str(role).upper().strip()
+
+    def load_state_snapshot(self, resource_type:str, query:str) -> dict:
+        """Fetch the state of every resource of a type with a single query.
+
+        Each row of the bulk state query must hold the same json object as the
+        resource `state_query`. The states are kept in memory, keyed by database,
+        schema and name, so resources of the same name in different schemas do
+        not overwrite each other, and used by `resource_state` instead of a
+        query per resource.
+        """
+        try:
+            rows = self.conn.exec_driver_sql(query).scalars().all()
+        except Exception as err:
+            raise SQLExecutionError(error=err, sql=query) from err
+
+        snapshot = {}
+        for row in rows:
+            if not row:
+                continue
+            state = json.loads(row)
+            key = self._snapshot_key(state["name"], database=state.get("database"), schema=state.get("schema"))
+            snapshot[key] = state
+
+        self.state_snapshots[resource_type] = snapshot
+        self.snapshot_databases[resource_type] = {database for database, _, _ in snapshot}
+        return snapshot
+
+    def snapshot_covers(self, definition:dict, name:str, resource_type:str | None) -> bool:
+        """Whether the state of the resource is read from the bulk snapshot of its type.
+
+        The bulk query only reads the information schema of the current database,
+        a resource of a database missing from the snapshot needs its state query.
+        """
+        snapshot = self.state_snapshots.get(resource_type)
+        if snapshot is None:
+            return False
+
+        key = self._snapshot_key(name, database=definition.get("database"), schema=definition.get("schema"))
+        return key in snapshot or not key[0] or key[0] in self.snapshot_databases[resource_type]
+
+    def _grant_key(
+        self,
+        privilege:str,
+        object_type:str,
+        object_name:str,
+        role:str,
+        grant_option:Any,
+    ) -> tuple:
+        """Normalize a grant for the role grants lookup."""
+        def clean(value:Any) -> str:
+            return str(value).replace('"', "").replace("_", " ").upper().strip()
+
+        return (
+            clean(privilege),
+            clean(object_type),
+            str(object_name).replace('"', "").upper().strip(),
+            str(role).replace('"', "").upper().strip(),
+            self.__clean_value(grant_option) is True,
+        )
+
+    def load_role_grants(self, role:str, query:str) -> set:
+        """Fetch every grant of a role with a single query.
+
+        The rows of the role grants query must have the columns of SHOW GRANTS
+        TO ROLE: privilege, granted_on, name, grantee_name and grant_option. The
+        grants are kept in memory as a set and used by `grant_state` instead of
+        a query per grant.
+        """
+        try:
+            rows = self.conn.exec_driver_sql(query).mappings().all()
+        except Exception as err:
+            if ROLE_NOT_FOUND not in str(err).lower():
+                raise SQLExecutionError(error=err, sql=query) from err
+            # The role does not exist yet, it has no grants.
+            rows = []
+
+        grants = {
+            self._grant_key(
+                privilege=row["privilege"],
+                object_type=row["granted_on"],
+                object_name=row["name"],
+                role=row["grantee_name"],
+                grant_option=row["grant_option"],
+            )
+            for row in rows
+        }
+        self.role_grants[self._role_key(role)] = grants
+        return grants
+
+    def grant_state(self, definition:dict) -> dict:
+        """Check the drift of a grant against the grants of its role, loaded with `load_role_grants`."""
+        key = self._grant_key(
+            privilege=definition.get("privilege", ""),
+            object_type=definition.get("on_object_type", ""),
+            object_name=definition.get("on_object", ""),
+            role=definition.get("to_role", ""),
+            grant_option=definition.get("with_grant_option", False),
+        )
+
+        if key in self.role_grants.get(self._role_key(definition.get("to_role", "")), set()):
+            return {
+                "iac_action":"no-action",
+                "definition":None,
+            }
+        return {
+            "iac_action":"create",
+            "definition":self._normalize_definition(definition),
+        }
+
 
     def __flatten_dict_gen(self, d:MutableMapping, parent_key, sep):
         for k, v in d.items():
@@ -140,8 +278,58 @@ class Drift:
         return CheckResult(match=True)
 
 
+    def _is_keyed_list(self, value:list) -> bool:
+        """True when every item of the list is a dict identified by its `name`."""
+        return all(isinstance(i, dict) and "name" in i for i in value)
+
+    def _as_set(self, value:list) -> set:
+        """Items of a list as a set, unhashable items by their json representation."""
+        return {
+            json.dumps(i, sort_keys=True, default=str) if isinstance(i, (dict, list)) else i
+            for i in value
+        }
+
+    def _check_keyed_list(self, state:list, definition:list) -> dict | None:
+        """Compare lists of dicts by their `name` in a single pass.
+
+        Returns:
+            dict | None: The definition items missing in the state as "added", the
+                state items missing in the definition as "removed", and the
+                definition items with different values as "changed", each with
+                the list of its "changed" fields. None when the lists match.
+
+        """
+        state_items = {i["name"]: i for i in state}
+        added, changed = [], []
+        seen = set()
+
+        for item in definition:
+            seen.add(item["name"])
+            current = state_items.get(item["name"])
+            if current is None:
+                added.append(item)
+                continue
+
+            # Empty definition values are not managed, as for the other values.
+            fields = [
+                k for k, v in item.items()
+                if v != current.get(k) and v != "" and v is not None
+            ]
+            if fields:
+                changed.append({**item, "changed": fields})
+
+        removed = [i for name, i in state_items.items() if name not in seen]
+        if not (added or removed or changed):
+            return None
+        return {"added": added, "removed": removed, "changed": changed}
+
     def _check_values(self, state:dict, definition:dict) -> CheckResult:
+        """Compare the definition values with the state values.
 
+        Lists of dicts identified by a `name`, such as table columns, are
+        compared item by item into the added, removed and changed items. Other
+        lists are compared as sets, the diff holds the whole definition list.
+        """
         if definition == state:
             return CheckResult(match=True)
 
@@ -156,15 +344,14 @@ class Drift:
                 if nested_result:  # Only include if there are mismatches
                     result[key] = nested_result
 
-            # Handle lists recursively
+            # Handle lists of named items by name, other lists as sets
             elif isinstance(defn_value, list) and isinstance(state_value, list):
-                list_result = []
-                # Compare items
-                for i in defn_value:
-                    if i not in state_value:
-                        list_result.append(i)
+                if self._is_keyed_list(defn_value) and self._is_keyed_list(state_value):
+                    list_result = self._check_keyed_list(state_value, defn_value)
                     if list_result:
                         result[key] = list_result
+                elif self._as_set(defn_value) != self._as_set(state_value):
+                    result[key] = defn_value
 
             # Handle primitive values
             elif defn_value != state_value:
@@ -172,7 +359,7 @@ class Drift:
                 if defn_value != "" and defn_value is not None:
                     result[key] = defn_value
 
-        return CheckResult(match=False, diff=result)
+        return CheckResult(match=not result, diff=result or None)
 
 
     def resource_state(
@@ -180,11 +367,25 @@ class Drift:
             definition:dict,
             state_query:str,
             name:str,
+            resource_type:str | None = None,
+            *,
+            covered:bool | None = None,
             ) -> dict:
-        """Compare the resource definition with the resource state."""
+        """Compare the resource definition with the resource state.
+
+        The state is read from the bulk snapshot of the resource type when it
+        covers the resource, otherwise the state query is executed. `covered`
+        is the outcome of `snapshot_covers` when the caller already has it.
+        """
         rsc_def = self._normalize_definition(definition)
 
-        rsc_state = self._fetch_state_query(state_query)
+        if covered is None:
+            covered = self.snapshot_covers(definition=definition, name=name, resource_type=resource_type)
+        if covered:
+            key = self._snapshot_key(name, database=definition.get("database"), schema=definition.get("schema"))
+            rsc_state = self.state_snapshots[resource_type].get(key)
+        else:
+            rsc_state = self._fetch_state_query(state_query)
 
         # If the resource does not exists in the database
         if not rsc_state:
@@ -206,7 +407,6 @@ class Drift:
             values_check:CheckResult = self._check_values(
                 definition=rsc_def,
                 state=rsc_state,
-                name=name,
                 )
 
             if not values_check.match:
@@ -3,16 +3,23 @@
 This module provides:
 - FileError: exception when the file path is incorrect;
 - DefinitionKeyError: exception when the definition yaml file keys are incorrect;
-- DependencyError: exception when the names of the resources in the dependecy map are incorrect.
+- DefinitionLoadError: exception when definition files loaded in parallel cannot be parsed;
+- DependencyError: exception when the dependency map has undefined resources or a cycle;
+- ExecutionError: exception when resources of the dependency graph fail to execute;
+- PlanningError: exception when several resources fail to be planned;
+- ReadinessError: exception when a resource is not ready before its wait time is over;
+- PlanError: exception when a plan file cannot be applied;
+- AlterError: exception when the drift of a resource cannot be applied with ALTER statements;
+- GitError: exception when a git command of the incremental mode fails;
+- SelectorError: exception when a graph selector does not match a resource.
 """
 
-import json
-from rich.console import Console
-from rich.syntax import Syntax
-
 # Maximum number of characters to include in SQL preview in error messages
 SQL_PREVIEW_MAX_LENGTH = 500
 
+# Maximum number of undefined dependencies listed in a dependency error
+DEPENDENCY_ERRORS_MAX_COUNT = 20
+
 
 class FileError(Exception):
     """File path error class."""
@@ -91,20 +98,55 @@ class DefinitionKeyError(Exception):
 
         super().__init__(message)
 
+class DefinitionLoadError(Exception):
+    """Raised when definition files cannot be parsed, with the error of every file."""
+
+    def __init__(self, errors:dict):
+        """Initialize the exception with the error message of each file.
+
+        Args:
+            errors (dict): The error message of every file that failed, by file path.
+
+        """
+        files_errors = "\n".join(f"- {path}: {error}" for path, error in errors.items())
+        super().__init__(f"{len(errors)} definition file(s) could not be loaded:\n{files_errors}")
+
+        self.errors = errors
+
 class DependencyError(Exception):
     """Dependencies names errors."""
 
-    def __init__(self, d_map:dict,*,is_cyclical:bool = False):
-        """Take the dependency map as a variable and format it for readability."""
-        formatted_map = json.dumps(d_map, indent=4)
-        if is_cyclical:
-            message = f"There is a cyclical dependecy in the map: \n{formatted_map}."
+    def __init__(self, dangling:list | None = None, cycle:list | None = None):
+        """Report the dependencies on undefined resources, or a cycle of the map.
+
+        Args:
+            dangling (list, optional): (resource, undefined dependency) pairs.
+            cycle (list, optional): Resources of a cycle, each depending on the
+                next one, the first one repeated at the end.
+
+        """
+        if cycle:
+            message = "There is a cyclical dependecy in the map:" \
+                f"\n{' -> '.join(cycle)}" \
+                "\nEach resource depends on the next one, remove one of these dependencies."
         else:
-            message = f"There is an incorrect dependency in the map:\n{formatted_map}" \
-            "\nMake sure the resources names are correct."
+            dangling = dangling or []
+            lines = [
+                f"- '{node}' depends on '{dependency}'"
+                for node, dependency in dangling[:DEPENDENCY_ERRORS_MAX_COUNT]
+            ]
+            if len(dangling) > DEPENDENCY_ERRORS_MAX_COUNT:
+                lines.append(f"... and {len(dangling) - DEPENDENCY_ERRORS_MAX_COUNT} more")
+            listed = "\n".join(lines)
+            message = "There is an incorrect dependency in the map, these resources are not defined:" \
+                f"\n{listed}" \
+                "\nMake sure the resources names are correct."
 
         super().__init__(message)
 
+        self.dangling = dangling or []
+        self.cycle = cycle or []
+
     """Custom exception for errors occurring during token request."""
 
 class SQLExecutionError(Exception):
@@ -127,6 +169,10 @@ class SQLExecutionError(Exception):
             database_system (str, optional): The database system (snowflake, sqlite, etc.).
 
         """
+        from rich.syntax import Syntax  # noqa: PLC0415
+
+        from output import OUTPUT  # noqa: PLC0415
+
         # Extract error details from SQLAlchemy exception
         error_message = str(error)
         error_code = getattr(error, "code", None)
@@ -156,10 +202,8 @@ class SQLExecutionError(Exception):
             parts.append("\n[bold red3]SQL Statement:[/bold red3]")
             parts.append(pretty_sql)
 
-        # Join all parts into final message
-        message = "\n".join(parts)
-
-        Console().print(message)
+        # Print all parts as one message, the SQL statement is a renderable
+        OUTPUT.print(*parts, sep="\n")
 
         super().__init__("\nEnd.")
 
@@ -168,3 +212,141 @@ class SQLExecutionError(Exception):
         self.sql = sql
         self.database_system = database_system
         self.error_code = error_code
+
+
+class ReadinessError(Exception):
+    """Raised when a resource is not ready before its wait time is over."""
+
+    def __init__(self, timeout:float, name:str=None, sql:str=None):
+        """Initialize the exception with the readiness query that kept failing.
+
+        Args:
+            timeout (float): The seconds waited for the resource.
+            name (str, optional): The resource key.
+            sql (str, optional): The readiness query.
+
+        """
+        resource = f" '{name}'" if name else ""
+        message = f"The resource{resource} was not ready after {timeout} seconds."
+        if sql:
+            message += f"\nReadiness query:\n{sql}"
+
+        super().__init__(message)
+
+        self.timeout = timeout
+        self.name = name
+        self.sql = sql
+
+
+class PlanError(Exception):
+    """Raised when a plan file is unreadable, of another version or stale."""
+
+    def __init__(self, path:str, reason:str):
+        """Initialize the exception with the plan file path and the reason it cannot be applied.
+
+        Args:
+            path (str): The plan file path.
+            reason (str): Why the plan cannot be applied.
+
+        """
+        super().__init__(f"The plan '{path}' cannot be applied: {reason}")
+
+        self.path = path
+        self.reason = reason
+
+
+class AlterError(Exception):
+    """Raised when the drift of a resource cannot be applied with ALTER statements."""
+
+    def __init__(self, name:str, changes:str):
+        """Initialize the exception with the resource and the changes its template cannot alter.
+
+        Args:
+            name (str): The resource name.
+            changes (str): The changes that cannot be altered.
+
+        """
+        super().__init__(
+            f"The drift of '{name}' cannot be applied with ALTER statements, "
+            f"the resource must be recreated: {changes}",
+        )
+
+        self.name = name
+        self.changes = changes
+
+
+class GitError(Exception):
+    """Raised when a git command of the incremental mode fails."""
+
+    def __init__(self, command:list, error:str):
+        """Initialize the exception with the failed command and its error output.
+
+        Args:
+            command (list): The git command arguments.
+            error (str): The error output of git.
+
+        """
+        super().__init__(
+            f"The git command '{' '.join(command)}' failed:\n{error.strip()}"
+            "\nMake sure the repository is checked out with the history of the base ref.",
+        )
+
+        self.command = command
+        self.error = error
+
+
+class SelectorError(Exception):
+    """Raised when a graph selector is invalid or does not match a resource."""
+
+    def __init__(self, selector:str, reason:str):
+        """Initialize the exception with the selector and the reason it is invalid.
+
+        Args:
+            selector (str): The selector, e.g. "+table::orders".
+            reason (str): Why the selector is invalid.
+
+        """
+        super().__init__(
+            f"Invalid selector '{selector}': {reason}."
+            "\nSelect a resource as 'resource_type::name', with '+' before it for its ancestors"
+            " and after it for its descendants.",
+        )
+
+        self.selector = selector
+        self.reason = reason
+
+
+class ExecutionError(Exception):
+    """Raised when resources of the dependency graph fail to execute."""
+
+    action = "execute"
+
+    def __init__(self, failed:dict, skipped:list | None = None):
+        """List the failed resources and the dependent resources that were skipped.
+
+        Args:
+            failed (dict): The failed resources with the raised exception.
+            skipped (list, optional): Resources not executed because a dependency failed.
+
+        """
+        skipped = skipped or []
+        # SQL errors print their details when raised, only the database error is repeated.
+        failed_str = "\n- ".join(
+            f"{node}: {getattr(error, 'original_error', error)}" for node, error in failed.items()
+        )
+        message = f"{len(failed)} resource(s) failed to {self.action}:\n- {failed_str}"
+
+        if skipped:
+            skipped_str = "\n- ".join(skipped)
+            message += f"\nSkipped {len(skipped)} dependent resource(s):\n- {skipped_str}"
+
+        super().__init__(message)
+
+        self.failed = failed
+        self.skipped = skipped
+
+
+class PlanningError(ExecutionError):
+    """Raised when several resources fail to be planned."""
+
+    action = "be planned"
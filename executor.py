@@ -0,0 +1,382 @@
+"""Execution of the dependency graph.
+
+This module provides:
+- Executor: runs the resources of the dependency map on a worker pool, each one as soon as its dependencies are done;
+- ExecutionResult: outcome of every resource of the run;
+- StatementBackend: interface to submit statements without waiting and poll them by query ID;
+- SnowflakeAsyncBackend: asynchronous backend using the Snowflake connector;
+- LocalBackend: backend executing the statements on submit, for other database systems and tests;
+- statement_backend: function that picks the backend of a database system;
+- split_statements: function that splits SQL into its statements.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from errors import ReadinessError, SQLExecutionError
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from sqlalchemy import Connection
+
+# Seconds between two status checks of the statements in flight.
+POLL_INTERVAL = 0.5
+
+# First and maximum seconds between two readiness checks of a resource, doubled after each check.
+READY_POLL_INTERVAL = 0.5
+READY_MAX_INTERVAL = 10
+
+
+@dataclass
+class ExecutionResult:
+    """Outcome of the execution of the dependency graph.
+
+    Attributes:
+        succeeded: Resources that finished, in completion order.
+        failed: Resources that raised, with the raised exception.
+        skipped: Resources not run because one of their dependencies failed.
+    """
+    succeeded: list[str] = field(default_factory=list)
+    failed: dict[str, Exception] = field(default_factory=dict)
+    skipped: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        """True when every resource succeeded."""
+        return not self.failed and not self.skipped
+
+
+def split_statements(sql: str) -> list[str]:
+    """Split SQL into its statements, without the trailing semicolons."""
+    if ";" not in sql:
+        # A single statement, tokenizing it would find nothing to split.
+        return [sql.strip()] if sql.strip() else []
+
+    import sqlparse  # noqa: PLC0415
+
+    return [
+        statement.strip().rstrip(";").strip()
+        for statement in sqlparse.split(sql)
+        if statement.strip().rstrip(";").strip()
+    ]
+
+
+class StatementBackend(ABC):
+    """Submit statements without waiting for them, and poll them by query ID."""
+
+    @abstractmethod
+    def submit(self, sql: str) -> str:
+        """Send the statement to the database and return its query ID."""
+
+    @abstractmethod
+    def is_done(self, query_id: str) -> bool:
+        """Return True once the query finished, raise if it failed."""
+
+
+class SnowflakeAsyncBackend(StatementBackend):
+    """Asynchronous statements through the Snowflake connector, many queries in flight on one connection."""
+
+    def __init__(self, conn: Connection):
+        """Use the Snowflake connector connection behind the SQLAlchemy connection."""
+        self.raw_conn = conn.connection.driver_connection
+
+    def submit(self, sql: str) -> str:
+        """Submit the statement with `execute_async` and return its query ID."""
+        cursor = self.raw_conn.cursor()
+        num_statements = len(split_statements(sql))
+        if num_statements > 1:
+            # Several statements are sent as one multi-statement request.
+            cursor.execute_async(sql, num_statements=num_statements)
+        else:
+            cursor.execute_async(sql)
+        return cursor.sfqid
+
+    def is_done(self, query_id: str) -> bool:
+        """Check the query status, raising the Snowflake error if the query failed."""
+        status = self.raw_conn.get_query_status_throw_if_error(query_id)
+        return not self.raw_conn.is_still_running(status)
+
+
+class LocalBackend(StatementBackend):
+    """Execute the statement on submit, for database systems without asynchronous queries."""
+
+    def __init__(self, conn: Connection):
+        """Initialize the backend with the connection the statements run on."""
+        self.conn = conn
+        self._ids = itertools.count(1)
+        self._errors: dict[str, Exception] = {}
+
+    def submit(self, sql: str) -> str:
+        """Execute the statement, a failure is reported when the query ID is polled."""
+        query_id = f"local-{next(self._ids)}"
+        try:
+            for statement in split_statements(sql):
+                self.conn.exec_driver_sql(statement)
+        except Exception as err:  # noqa: BLE001
+            self._errors[query_id] = err
+        return query_id
+
+    def is_done(self, query_id: str) -> bool:
+        """The statement already finished, raise its error if it failed."""
+        error = self._errors.pop(query_id, None)
+        if error is not None:
+            raise error
+        return True
+
+
+def statement_backend(conn: Connection, database_system: str) -> StatementBackend:
+    """Return the asynchronous backend of the database system, or the local one."""
+    if database_system.lower() == "snowflake":
+        return SnowflakeAsyncBackend(conn)
+    return LocalBackend(conn)
+
+
+class Executor:
+    """Run the resources of a dependency map concurrently."""
+
+    def __init__(
+        self,
+        d_map: dict,
+        max_workers: int = 4,
+        connection_factory: Callable[[], Connection] | None = None,
+    ):
+        """Prepare the dependency graph for the execution.
+
+        Args:
+            d_map (dict): Dependency map of "resource_type::name" to the resources it depends on.
+            max_workers (int): Maximum number of resources executed at the same time.
+            connection_factory (Callable, optional): Opens a database connection, called once per worker.
+
+        """
+        self.d_map = d_map
+        self.max_workers = max(1, max_workers)
+        self.connection_factory = connection_factory
+
+        # Reverse edges, from a resource to the resources depending on it.
+        self.dependents: dict[str, list[str]] = {node: [] for node in d_map}
+        for node, dependencies in d_map.items():
+            for dependency in dependencies:
+                self.dependents.setdefault(dependency, []).append(node)
+
+        self._local = threading.local()
+        self._connections: list[Connection] = []
+        self._connections_lock = threading.Lock()
+
+    def _worker_connection(self) -> Connection | None:
+        """Return the connection of the current worker, opening it on first use."""
+        if self.connection_factory is None:
+            return None
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connection_factory()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _run_node(self, task: Callable[[str, Connection], None], node: str) -> None:
+        task(node, self._worker_connection())
+
+    def _skip_downstream(self, node: str, blocked: set[str], result: ExecutionResult) -> None:
+        """Mark every resource downstream of a failed resource as skipped."""
+        for dependent in self._downstream(node):
+            if dependent not in blocked:
+                blocked.add(dependent)
+                result.skipped.append(dependent)
+
+    def _downstream(self, node: str) -> list[str]:
+        """All the resources that depend directly or transitively on the node."""
+        downstream = []
+        seen = {node}
+        stack = list(self.dependents.get(node, []))
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            downstream.append(current)
+            stack.extend(self.dependents.get(current, []))
+        return downstream
+
+    def run(self, task: Callable[[str, Connection], None]) -> ExecutionResult:
+        """Execute the task for every resource, respecting the dependencies.
+
+        A resource is submitted as soon as all its dependencies succeeded. When a
+        resource fails, only the resources downstream of it are skipped, the rest
+        of the graph keeps running.
+
+        Args:
+            task (Callable): Called with the resource key and the worker connection.
+
+        Returns:
+            ExecutionResult: The succeeded, failed and skipped resources.
+
+        """
+        result = ExecutionResult()
+        pending = {node: len(dependencies) for node, dependencies in self.d_map.items()}
+        blocked: set[str] = set()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                running = {
+                    pool.submit(self._run_node, task, node): node
+                    for node, count in pending.items()
+                    if count == 0
+                }
+
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        node = running.pop(future)
+                        error = future.exception()
+
+                        if error is not None:
+                            result.failed[node] = error
+                            self._skip_downstream(node, blocked, result)
+                            continue
+
+                        result.succeeded.append(node)
+                        for dependent in self.dependents.get(node, []):
+                            pending[dependent] -= 1
+                            if pending[dependent] == 0 and dependent not in blocked:
+                                running[pool.submit(self._run_node, task, dependent)] = dependent
+        finally:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+        return result
+
+    def run_async(  # noqa: PLR0912, PLR0915
+        self,
+        backend: StatementBackend,
+        statements: dict[str, str | None],
+        ready_checks: dict[str, tuple[Callable[[], bool] | None, float]] | None = None,
+        max_in_flight: int | None = None,
+        poll_interval: float = POLL_INTERVAL,
+    ) -> ExecutionResult:
+        """Submit the statements of the graph without waiting and poll them by query ID.
+
+        A statement is submitted as soon as all the statements it depends on
+        completed, so independent long running statements are in flight at the
+        same time on a single connection. A resource with a readiness check is
+        completed only once the check succeeds, polled with backoff until its
+        timeout, so only its dependents wait for it. Without a probe, the resource
+        is completed once its timeout is over, without blocking the others.
+
+        Args:
+            backend (StatementBackend): Submits the statements and reports their status.
+            statements (dict): SQL of every resource, None when there is nothing to execute.
+            ready_checks (dict, optional): Readiness probe and timeout in seconds of the resources that need one.
+            max_in_flight (int, optional): Maximum number of statements running at the same time, defaults to max_workers.
+            poll_interval (float): Seconds between two status checks.
+
+        Returns:
+            ExecutionResult: The succeeded, failed and skipped resources.
+
+        """
+        ready_checks = ready_checks or {}
+        max_in_flight = max_in_flight or self.max_workers
+        result = ExecutionResult()
+        pending = {node: len(dependencies) for node, dependencies in self.d_map.items()}
+        ready = deque(node for node, count in pending.items() if count == 0)
+        blocked: set[str] = set()
+        in_flight: dict[str, str] = {}
+        # Executed resources waiting to be ready: deadline, next probe time, probe interval.
+        waiting: dict[str, tuple[float, float, float]] = {}
+
+        def complete(node: str) -> None:
+            result.succeeded.append(node)
+            for dependent in self.dependents.get(node, []):
+                pending[dependent] -= 1
+                if pending[dependent] == 0 and dependent not in blocked:
+                    ready.append(dependent)
+
+        def executed(node: str) -> None:
+            if node in ready_checks:
+                probe, timeout = ready_checks[node]
+                now = time.monotonic()
+                next_probe = now if probe else now + timeout
+                waiting[node] = (now + timeout, next_probe, READY_POLL_INTERVAL)
+            else:
+                complete(node)
+
+        def fail(node: str, error: Exception) -> None:
+            if not isinstance(error, (SQLExecutionError, ReadinessError)):
+                error = SQLExecutionError(error=error, sql=statements.get(node))
+            result.failed[node] = error
+            self._skip_downstream(node, blocked, result)
+
+        while ready or in_flight or waiting:
+            while ready and len(in_flight) < max_in_flight:
+                node = ready.popleft()
+                sql = statements.get(node)
+                if not sql:
+                    complete(node)
+                    continue
+                try:
+                    in_flight[backend.submit(sql)] = node
+                except Exception as err:  # noqa: BLE001
+                    fail(node, err)
+
+            progressed = False
+            for query_id, node in list(in_flight.items()):
+                try:
+                    done = backend.is_done(query_id)
+                except Exception as err:  # noqa: BLE001
+                    del in_flight[query_id]
+                    fail(node, err)
+                    progressed = True
+                    continue
+
+                if done:
+                    del in_flight[query_id]
+                    executed(node)
+                    progressed = True
+
+            now = time.monotonic()
+            for node, (deadline, next_probe, interval) in list(waiting.items()):
+                if now < next_probe:
+                    continue
+                probe, timeout = ready_checks[node]
+                try:
+                    is_ready = probe() if probe else now >= deadline
+                except Exception as err:  # noqa: BLE001
+                    del waiting[node]
+                    fail(node, err)
+                    progressed = True
+                    continue
+
+                if is_ready:
+                    del waiting[node]
+                    complete(node)
+                    progressed = True
+                elif now >= deadline:
+                    del waiting[node]
+                    fail(node, ReadinessError(timeout=timeout, name=node))
+                    progressed = True
+                else:
+                    waiting[node] = (
+                        deadline,
+                        now + min(interval, deadline - now),
+                        min(interval * 2, READY_MAX_INTERVAL),
+                    )
+
+            if not progressed and (in_flight or waiting):
+                # Sleep until the next status check or the next readiness probe, also when
+                # statements are ready but the in-flight limit is reached.
+                delays = [poll_interval] if in_flight else []
+                delays.extend(next_probe - now for _, next_probe, _ in waiting.values())
+                time.sleep(max(0, min(delays)))
+
+        return result
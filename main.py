@@ -2,19 +2,43 @@
 
 This module provides:
 - main: main function that orchestrates the pipeline;
+- connect: function that checks out a database connection of the pool;
+- apply_plan: function that executes the plan;
 - str_to_bool: function for bool input vars;
 - to_str: function for string input vars that might be empty or null;
 """
 
+from __future__ import annotations
+
 import os
 import tomllib
 
 from utils import Utils
-from errors import TemplateFileError, FileError
+from errors import (
+    AlterError,
+    TemplateFileError,
+    FileError,
+    DefinitionLoadError,
+    ExecutionError,
+    PlanError,
+    PlanningError,
+    GitError,
+    SelectorError,
+    SQLExecutionError,
+)
 from drift import Drift
-from rich.console import Console
-from rich.syntax import Syntax
+from executor import Executor, ExecutionResult, split_statements, statement_backend
+from plan import Plan, Planner
+from state_cache import StateCache
+from connection import ConnectionManager
+from output import OUTPUT
+from tracing import TRACER
+from metrics import METRICS, MeteredConnection
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sqlalchemy import Connection
 
 
 def str_to_bool(s: str) -> bool:
@@ -40,6 +64,21 @@ class InputConfig:
     resources_path: str | None
     dry_run: bool
     run_mode: str
+    execution_mode: str = "serial"
+    max_concurrency: int = 4
+    plan_path: str = "/sqliac.plan.json"
+    state_cache_path: str | None = None
+    state_cache_ttl: float = 86400
+    refresh: bool = False
+    base_ref: str | None = None
+    select: str | None = None
+    batch_size: int = 1
+    load_workers: int = 1
+    consolidate_grants: bool = False
+    trace_path: str | None = None
+    metrics_path: str | None = None
+    output_mode: str = "rich"
+    output_path: str = "/sqliac.output.ndjson"
 
 def parse_env() -> InputConfig:
     """Read and normalize inputs from the environment."""
@@ -64,6 +103,21 @@ def parse_env() -> InputConfig:
 
     dry_run = str_to_bool(os.environ.get("INPUT_DRY-RUN", "false"))
     run_mode = os.environ.get("INPUT_RUN-MODE", "default")
+    execution_mode = os.environ.get("INPUT_EXECUTION-MODE", "serial")
+    max_concurrency = int(os.environ.get("INPUT_MAX-CONCURRENCY", "4"))
+    plan_path = os.environ.get("INPUT_PLAN-PATH", "/sqliac.plan.json")
+    state_cache_path = to_str(os.environ.get("INPUT_STATE-CACHE-PATH"))
+    state_cache_ttl = float(os.environ.get("INPUT_STATE-CACHE-TTL", "86400"))
+    refresh = str_to_bool(os.environ.get("INPUT_REFRESH", "false"))
+    base_ref = to_str(os.environ.get("INPUT_BASE-REF"))
+    select = to_str(os.environ.get("INPUT_SELECT"))
+    batch_size = int(os.environ.get("INPUT_BATCH-SIZE", "1"))
+    load_workers = int(os.environ.get("INPUT_LOAD-WORKERS", "1"))
+    consolidate_grants = str_to_bool(os.environ.get("INPUT_CONSOLIDATE-GRANTS", "false"))
+    trace_path = to_str(os.environ.get("INPUT_TRACE-PATH"))
+    metrics_path = to_str(os.environ.get("INPUT_METRICS-PATH"))
+    output_mode = os.environ.get("INPUT_OUTPUT-MODE", "rich")
+    output_path = os.environ.get("INPUT_OUTPUT-PATH", "/sqliac.output.ndjson")
     return InputConfig(
         workspace=workspace,
         database_system=database_system,
@@ -71,8 +125,153 @@ def parse_env() -> InputConfig:
         resources_path=resources_path,
         dry_run=dry_run,
         run_mode=run_mode,
+        execution_mode=execution_mode,
+        max_concurrency=max_concurrency,
+        plan_path=plan_path,
+        state_cache_path=state_cache_path,
+        state_cache_ttl=state_cache_ttl,
+        refresh=refresh,
+        base_ref=base_ref,
+        select=select,
+        batch_size=batch_size,
+        load_workers=load_workers,
+        consolidate_grants=consolidate_grants,
+        trace_path=trace_path,
+        metrics_path=metrics_path,
+        output_mode=output_mode,
+        output_path=output_path,
     )
 
+def connect(connections: ConnectionManager, config: InputConfig) -> Connection:
+    """Check out a pooled database connection, recording its queries when the metrics are enabled."""
+    conn = connections.connect()
+    if config.metrics_path:
+        return MeteredConnection(conn)
+    return conn
+
+
+def apply_plan(  # noqa: PLR0912, PLR0913, PLR0917
+    plan: Plan,
+    conn: Connection,
+    utils: Utils,
+    config: InputConfig,
+    state_cache: StateCache | None = None,
+    batch_template: str | None = None,
+    connections: ConnectionManager | None = None,
+) -> None:
+    """Execute the SQL of the planned resources in dependency order."""
+    def reconciled(node: str) -> None:
+        # Record in the state cache the resources that now match their definition.
+        if state_cache is None or not plan.items[node].sql:
+            return
+        # Resources merged into the statement are reconciled with it.
+        for resource in plan.resources(node):
+            item = plan.items[resource]
+            if item.iac_action == "drop":
+                state_cache.forget(resource)
+            elif item.fingerprint:
+                state_cache.record(resource, item.fingerprint)
+
+    def failure(result: ExecutionResult) -> ExecutionError:
+        # Report the outcome of every resource merged into a failed or skipped statement.
+        return ExecutionError(
+            failed={
+                resource: error
+                for node, error in result.failed.items()
+                for resource in plan.resources(node)
+            },
+            skipped=[resource for node in result.skipped for resource in plan.resources(node)],
+        )
+
+    def execute_item(node: str, item_conn: Connection) -> None:
+        item = plan.items[node]
+        if item.sql:
+            with TRACER.span(node, "execute", node=node), METRICS.labels(item.resource_type):
+                utils.execute_rendered_sql_template(
+                    conn=item_conn,
+                    sql=item.sql,
+                    wait_time=item.wait_time,
+                    ready_query=item.ready_query,
+                    node=node,
+                )
+            reconciled(node)
+
+    if config.execution_mode.lower() == "parallel":
+        # Every resource starts as soon as its dependencies are done,
+        # each worker uses its own connection.
+        if connections is None:
+            connections = ConnectionManager(utils, config.database_system, config.max_concurrency)
+        result = Executor(
+            d_map=plan.d_map(),
+            max_workers=config.max_concurrency,
+            connection_factory=lambda: connect(connections, config),
+        ).run(execute_item)
+
+        if not result.ok:
+            raise failure(result)
+    elif config.execution_mode.lower() == "async":
+        # Statements are submitted without waiting and polled by query ID,
+        # independent statements are in flight at the same time on one connection.
+        result = Executor(
+            d_map=plan.d_map(),
+            max_workers=config.max_concurrency,
+        ).run_async(
+            backend=statement_backend(conn, config.database_system),
+            statements={node: item.sql for node, item in plan.items.items()},
+            ready_checks={
+                item.node: (
+                    (lambda query=item.ready_query: utils.is_ready(conn=conn, ready_query=query))
+                    if item.ready_query else None,
+                    item.wait_time,
+                )
+                for item in plan.changes()
+                if item.wait_time
+            },
+        )
+
+        for node in result.succeeded:
+            # The statements were submitted by the backend, not executed through `utils`.
+            if plan.items[node].sql:
+                utils.output.executed(node=node, statements=len(split_statements(plan.items[node].sql)))
+            reconciled(node)
+
+        if not result.ok:
+            raise failure(result)
+    elif config.batch_size > 1 and batch_template:
+        # Independent statements are sent together, a failure is reported
+        # for the resource of the failed statement.
+        for batch in plan.batches(config.batch_size):
+            if len(batch) == 1:
+                try:
+                    execute_item(batch[0].node, conn)
+                except SQLExecutionError as err:
+                    raise failure(ExecutionResult(failed={batch[0].node: err})) from err
+                continue
+
+            with TRACER.span(f"batch of {len(batch)}", "execute_batch", nodes=[item.node for item in batch]):
+                batch_failure = utils.execute_batch(
+                    conn=conn,
+                    template=batch_template,
+                    statements=[item.sql for item in batch],
+                )
+            executed = batch if batch_failure is None else batch[:batch_failure[0]]
+            for item in executed:
+                reconciled(item.node)
+            if batch_failure is not None:
+                # The statements after the failed one are not executed.
+                index, error = batch_failure
+                raise failure(ExecutionResult(
+                    failed={batch[index].node: SQLExecutionError(error=Exception(error), sql=batch[index].sql)},
+                    skipped=[item.node for item in batch[index + 1:]],
+                ))
+    else:
+        for item in plan.changes():
+            try:
+                execute_item(item.node, conn)
+            except SQLExecutionError as err:
+                raise failure(ExecutionResult(failed={item.node: err})) from err
+
+
 def run(config: InputConfig) -> None:  # noqa: PLR0912, PLR0915
     """Orchestrate the pipeline."""
     definitions_path = f"{config.workspace}{config.definitions_path}"
@@ -83,13 +282,41 @@ def run(config: InputConfig) -> None:  # noqa: PLR0912, PLR0915
     )
 
     # Map the dependencies of all the definitions in the yaml files
-    d_map:dict = utils.dependencies_map()
+    with TRACER.span("dependencies_map"):
+        d_map:dict = utils.dependencies_map(workers=config.load_workers)
+
+    # Cut the graph down before anything is rendered or queried.
+    selected = set(d_map)
+
+    # Incremental mode, only the resources changed since the base ref and their dependents.
+    if config.base_ref:
+        with TRACER.span("changed_definitions"):
+            changed, removed = utils.changed_definitions(config.base_ref)
+        selected &= utils.downstream(d_map, changed)
+        OUTPUT.print(
+            f"[bold]Incremental run against '{config.base_ref}':[/bold] {len(changed)} changed",
+        )
+        for node in sorted(removed):
+            OUTPUT.print(
+                f"[bold sandy_brown]Removed from the definitions, not dropped: '{node}'[/bold sandy_brown]",
+            )
+
+    # Selected resources, with their ancestors or descendants.
+    if config.select:
+        selected &= utils.select_nodes(d_map, config.select)
+
+    if len(selected) < len(d_map):
+        d_map = utils.subgraph(d_map, selected)
+        OUTPUT.print(f"[bold]{len(d_map)} resources to plan[/bold]")
 
     # Do topographic sorting of the dependecies
-    sorted_map:list[str] = utils.dependencies_sort(d_map)
+    with TRACER.span("dependencies_sort"):
+        sorted_map:list[str] = utils.dependencies_sort(d_map)
 
-    # Establish the connection
-    conn = utils.create_db_sys_connection(database_system=config.database_system)
+    # Establish the connection, the workers check out their own from the same pool.
+    connections = ConnectionManager(utils, config.database_system, config.max_concurrency)
+    with TRACER.span("connect"):
+        conn = connect(connections, config)
 
     # Initate drift class to compare object states
     drift = Drift(conn=conn)
@@ -97,123 +324,136 @@ def run(config: InputConfig) -> None:  # noqa: PLR0912, PLR0915
     # Load all resources
     # TODO: separate the load of a resources config with check of nesesary keys
     try:
-        with open(config.resources_path, "rb") as f:
+        with TRACER.span("load_resources"), open(config.resources_path, "rb") as f:
             db_sys_config = tomllib.load(f)
             db_sys_resources = db_sys_config[config.database_system]["resources"]
+            batch_template = db_sys_config[config.database_system].get("batch", {}).get("template")
     except FileNotFoundError as err:
         raise FileError(config.resources_path) from err
 
-    # Print out the map planning, excecute if not a dry-run.
-    for i in sorted_map:
-        resource_type, resource_name = i.split("::")
-
-        file_path = os.path.join(definitions_path, f"{resource_type}.toml")
-
-        try:
-            with open(file_path, "rb") as f:
-                definition = tomllib.load(f)
-        except FileNotFoundError as err :
-            raise FileError(path=file_path, resource_type=resource_type) from err
-
-        try:
-            for rsc in definition[resource_type]:
-                # This is for benefit of following the sorter order
-                if rsc["name"] == resource_name:
-
-                    rsc_state_query = utils.render_templates(
-                        template=db_sys_resources[resource_type]["state_query"],
-                        name=resource_name,
-                        definition=rsc,
-                    )
-
-                    rsc_drift = drift.resource_state(
-                        definition=rsc,
-                        state_query=rsc_state_query,
-                        name=resource_name,
-                        )
-
-                    if config.run_mode.lower() == "create-or-update":
-                        # If there is no drift, then it is a new object.
-                        if rsc_drift["iac_action"]=="create":
-                            sql = utils.render_templates(
-                                template=db_sys_resources[resource_type]["template"],
-                                definition=rsc_drift["definition"],
-                                name=resource_name,
-                                iac_action=db_sys_resources[resource_type]["iac_action"]["create"],
-                            )
-
-                            Console().print(f"\n[bold green3] + Create '{resource_type}'[/bold green3]")
-                            pretty_sql = Syntax(sql, "sql", theme="monokai", line_numbers=False)
-                            Console().print(pretty_sql)
-
-                            if not config.dry_run:
-                                utils.execute_rendered_sql_template(
-                                    connection=conn,
-                                    sql=sql,
-                                    wait_time=rsc.get("wait_time", None),
-                                )
-
-                        # Do nothing if the the object has not drifted, definition and the state are the same.
-                        elif rsc_drift["iac_action"]=="no action":
-                            continue
-
-                        # If the object drifted, alter the properties of the object.
-                        elif rsc_drift["iac_action"]=="alter":
-                            sql = utils.render_templates(
-                                template=db_sys_resources[resource_type]["template"],
-                                definition=rsc_drift["definition"],
-                                name=resource_name,
-                                iac_action=db_sys_resources[resource_type]["iac_action"]["alter"],
-                            )
-
-                            Console().print(f"\n[bold sandy_brown] ~ Alter '{resource_type}'[/bold sandy_brown]")
-                            pretty_sql = Syntax(sql, "sql", theme="monokai", line_numbers=False)
-                            Console().print(pretty_sql)
-
-                            if not config.dry_run:
-                                utils.execute_rendered_sql_template(
-                                    connection=conn,
-                                    sql=sql,
-                                    wait_time=rsc.get("wait_time", None),
-                                )
-
-                    elif config.run_mode.lower() == "destroy":
-                        sql = utils.render_templates(
-                            template=db_sys_resources[resource_type]["template"],
-                            definition=rsc_drift["definition"],
-                            name=resource_name,
-                            iac_action=db_sys_resources[resource_type]["iac_action"]["drop"],
-                        )
-
-                        Console().print(f"\n[bold red3] - Drop '{resource_type}'[/bold red3]")
-                        pretty_sql = Syntax(sql, "sql", theme="monokai", line_numbers=False)
-                        Console().print(pretty_sql)
-
-                        if not config.dry_run:
-                            utils.execute_rendered_sql_template(
-                                connection=conn,
-                                sql=sql,
-                                wait_time=rsc.get("wait_time", None),
-                            )
-
-        except Exception as err:
-            conn.close()
-            raise TemplateFileError(resource_name, config.resources_path, err) from err
-    conn.close()
+    run_mode = config.run_mode.lower()
+    plan_path = f"{config.workspace}{config.plan_path}"
+
+    # Resources unchanged since their last reconcile skip the drift check.
+    state_cache = None
+    if config.state_cache_path:
+        state_cache = StateCache(
+            path=f"{config.workspace}{config.state_cache_path}",
+            ttl=config.state_cache_ttl,
+            refresh=config.refresh,
+        )
+
+    try:
+        if run_mode == "apply":
+            # Apply a saved plan, the drift phase is skipped.
+            plan = Plan.load(plan_path)
+            plan.check_fresh(
+                path=plan_path,
+                account_fingerprint=utils.account_fingerprint(config.database_system),
+                definitions_fingerprint=utils.definitions_fingerprint(),
+            )
+        else:
+            # Plan phase, check the drift of every resource before anything is executed.
+            planner = Planner(
+                utils=utils,
+                db_sys_resources=db_sys_resources,
+                run_mode="create-or-update" if run_mode == "plan" else run_mode,
+                state_cache=state_cache,
+            )
+            with TRACER.span("plan"):
+                plan = planner.build(
+                    sorted_map=sorted_map,
+                    d_map=d_map,
+                    drift=drift,
+                    max_workers=config.max_concurrency,
+                    connection_factory=lambda: connect(connections, config),
+                )
+                if config.consolidate_grants:
+                    plan = planner.consolidate_grants(plan)
+
+        # Print out the map planning, excecute if not a dry-run.
+        with TRACER.span("print_plan"):
+            for item in plan.changes():
+                OUTPUT.plan_item(item)
+            OUTPUT.flush()
+
+        # Resources the drift check found in sync are reconciled.
+        if state_cache is not None:
+            for item in plan.items.values():
+                if item.fingerprint and item.iac_action == "no-action" and not item.cached:
+                    state_cache.record(item.node, item.fingerprint)
+
+        if run_mode == "plan":
+            # Save the plan for a later apply run instead of executing it.
+            plan.account_fingerprint = utils.account_fingerprint(config.database_system)
+            plan.definitions_fingerprint = utils.definitions_fingerprint()
+            plan.write(plan_path)
+            OUTPUT.print(f"\n[bold green3]Plan saved to '{plan_path}'[/bold green3]")
+
+        elif not config.dry_run:
+            with TRACER.span("apply"):
+                apply_plan(
+                    plan=plan,
+                    conn=conn,
+                    utils=utils,
+                    config=config,
+                    state_cache=state_cache,
+                    batch_template=batch_template,
+                    connections=connections,
+                )
+    finally:
+        conn.close()
+        stats = connections.stats
+        connections.dispose()
+        if state_cache is not None:
+            state_cache.save()
+        OUTPUT.flush()
+
+    if stats.checkouts > 1:
+        OUTPUT.print(
+            f"[bold]Connection pool:[/bold] {stats.checkouts} checkouts, "
+            f"waited {stats.wait_seconds:.3f}s in total, {stats.max_wait_seconds:.3f}s at most",
+        )
+        OUTPUT.flush()
 
 
 
 def main():
     """Entry point of the pipeline."""
+    trace_path = None
+    metrics_path = None
     try:
         cfg = parse_env()
+        if cfg.trace_path:
+            # Spans of the phases and resources, written even when the run fails.
+            trace_path = f"{cfg.workspace}{cfg.trace_path}"
+            TRACER.enable()
+        if cfg.metrics_path:
+            metrics_path = f"{cfg.workspace}{cfg.metrics_path}"
+        OUTPUT.configure(cfg.output_mode, f"{cfg.workspace}{cfg.output_path}")
         run(cfg)
-    except (TemplateFileError, FileError) as e:
-        Console().print(f"[bold red3]Configuration error:[/bold red3] {e}")
+        OUTPUT.summary()
+    except (TemplateFileError, FileError, DefinitionLoadError, PlanError, AlterError, GitError, SelectorError) as e:
+        OUTPUT.print(f"[bold red3]Configuration error:[/bold red3] {e}")
+        raise
+    except PlanningError as e:
+        OUTPUT.print(f"[bold red3]Planning error:[/bold red3] {e}")
+        raise
+    except ExecutionError as e:
+        OUTPUT.print(f"[bold red3]Execution error:[/bold red3] {e}")
         raise
     except Exception:
-        Console().print("[bold red3]Unexpected error[/bold red3]")
+        OUTPUT.print("[bold red3]Unexpected error[/bold red3]")
         raise
+    finally:
+        if trace_path:
+            TRACER.write(trace_path)
+            TRACER.summary()
+            OUTPUT.print(f"[bold green3]Trace saved to '{trace_path}'[/bold green3]")
+        if metrics_path:
+            METRICS.write(metrics_path)
+            OUTPUT.print(f"[bold green3]Metrics saved to '{metrics_path}'[/bold green3]")
+        OUTPUT.close()
 
 if __name__ == "__main__":
     main()
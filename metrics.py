@@ -0,0 +1,196 @@
+"""Database round-trip metrics of the pipeline run.
+
+This module provides:
+- Metrics: counts, latency histograms, rows fetched and errors of the queries, by kind and resource type;
+- MeteredConnection: connection proxy recording every statement it executes;
+- METRICS: the metrics shared by the pipeline modules.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from sqlalchemy import Connection
+
+# Upper bounds in seconds of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# First keywords of the statements that read the state of the resources.
+STATE_KEYWORDS = {"SELECT", "WITH", "SHOW", "DESCRIBE", "DESC", "PRAGMA"}
+
+
+def statement_kind(sql: str) -> str:
+    """Kind of a statement, "state" for reads and "ddl" for everything else."""
+    keyword = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+    return "state" if keyword in STATE_KEYWORDS else "ddl"
+
+
+class Metrics:
+    """Queries sent to the database, labeled by kind and resource type."""
+
+    def __init__(self):
+        """Initialize empty metrics."""
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (kind, resource type) -> [queries, errors, rows, seconds, bucket counts]
+        self.series: dict[tuple[str, str], list] = {}
+
+    @contextmanager
+    def labels(self, resource_type: str) -> Iterator[None]:
+        """Label the queries of the current thread with the resource type."""
+        previous = getattr(self._local, "resource_type", None)
+        self._local.resource_type = resource_type
+        try:
+            yield
+        finally:
+            self._local.resource_type = previous
+
+    def observe(self, sql: str, seconds: float, rows: int = 0, *, error: bool = False) -> None:
+        """Record a query with the labels of the current thread."""
+        key = (statement_kind(sql), getattr(self._local, "resource_type", None) or "none")
+        with self._lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0, 0, 0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+            series[0] += 1
+            series[1] += int(error)
+            series[2] += rows
+            series[3] += seconds
+            series[4][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def clear(self) -> None:
+        """Drop the recorded queries."""
+        with self._lock:
+            self.series.clear()
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text format, for the node exporter textfile collector."""
+        lines = [
+            "# HELP sqliac_queries_total Queries sent to the database.",
+            "# TYPE sqliac_queries_total counter",
+        ]
+        with self._lock:
+            series = sorted(self.series.items())
+
+        def labels(kind: str, resource_type: str, **extra: str) -> str:
+            pairs = {"kind": kind, "resource_type": resource_type, **extra}
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs.items()) + "}"
+
+        for (kind, resource_type), (queries, _, _, _, _) in series:
+            lines.append(f"sqliac_queries_total{labels(kind, resource_type)} {queries}")
+
+        lines.extend([
+            "# HELP sqliac_query_errors_total Queries that failed.",
+            "# TYPE sqliac_query_errors_total counter",
+        ])
+        for (kind, resource_type), (_, errors, _, _, _) in series:
+            lines.append(f"sqliac_query_errors_total{labels(kind, resource_type)} {errors}")
+
+        lines.extend([
+            "# HELP sqliac_query_rows_total Rows fetched by the queries.",
+            "# TYPE sqliac_query_rows_total counter",
+        ])
+        for (kind, resource_type), (_, _, rows, _, _) in series:
+            lines.append(f"sqliac_query_rows_total{labels(kind, resource_type)} {rows}")
+
+        lines.extend([
+            "# HELP sqliac_query_duration_seconds Round-trip time of the queries.",
+            "# TYPE sqliac_query_duration_seconds histogram",
+        ])
+        for (kind, resource_type), (queries, _, _, seconds, buckets) in series:
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), buckets, strict=True):
+                cumulative += count
+                lines.append(
+                    f"sqliac_query_duration_seconds_bucket{labels(kind, resource_type, le=str(bound))} {cumulative}",
+                )
+            lines.append(f"sqliac_query_duration_seconds_sum{labels(kind, resource_type)} {seconds:.6f}")
+            lines.append(f"sqliac_query_duration_seconds_count{labels(kind, resource_type)} {queries}")
+
+        return "\n".join(lines) + "\n"
+
+    def markdown(self) -> str:
+        """Summary table of the queries in Markdown, for the GitHub job summary."""
+        lines = [
+            "### Database queries",
+            "",
+            "| Kind | Resource type | Queries | Errors | Rows | Total (s) | Mean (ms) | p95 (ms) |",
+            "| --- | --- | ---: | ---: | ---: | ---: | ---: | ---: |",
+        ]
+        with self._lock:
+            series = sorted(self.series.items(), key=lambda s: s[1][3], reverse=True)
+
+        for (kind, resource_type), (queries, errors, rows, seconds, buckets) in series:
+            lines.append(
+                f"| {kind} | {resource_type} | {queries} | {errors} | {rows} | {seconds:.3f} "
+                f"| {seconds / queries * 1000:.1f} | {self._percentile(buckets, queries, 0.95)} |",
+            )
+        return "\n".join(lines) + "\n"
+
+    def _percentile(self, buckets: list[int], queries: int, quantile: float) -> str:
+        """Upper bound of the histogram bucket holding the quantile, in milliseconds."""
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, None), buckets, strict=True):
+            cumulative += count
+            if cumulative >= quantile * queries:
+                return f"<= {bound * 1000:g}" if bound is not None else f"> {LATENCY_BUCKETS[-1] * 1000:g}"
+        return ""
+
+    def write(self, path: str) -> None:
+        """Write the Prometheus textfile, and the Markdown summary to $GITHUB_STEP_SUMMARY when it is set."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+
+        step_summary = os.environ.get("GITHUB_STEP_SUMMARY")
+        if step_summary:
+            with open(step_summary, "a", encoding="utf-8") as f:
+                f.write(self.markdown())
+
+
+class MeteredConnection:
+    """Connection proxy recording the latency and the rows of every statement in the metrics.
+
+    Everything but `exec_driver_sql` is passed to the wrapped connection.
+    """
+
+    def __init__(self, conn: Connection, metrics: Metrics | None = None):
+        """Wrap the connection, recording in the shared metrics by default."""
+        self._conn = conn
+        self._metrics = metrics if metrics is not None else METRICS
+
+    def exec_driver_sql(self, statement: str, *args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        """Execute the statement and record it, the rows are fetched to be counted."""
+        start = time.perf_counter()
+        try:
+            result = self._conn.exec_driver_sql(statement, *args, **kwargs)
+            if result.returns_rows:
+                # Fetch the rows once to count them, and hand out a copy of the result.
+                frozen = result.freeze()
+                rows = len(frozen.data)
+                result = frozen()
+            else:
+                rows = 0
+        except Exception:
+            self._metrics.observe(statement, time.perf_counter() - start, error=True)
+            raise
+
+        self._metrics.observe(statement, time.perf_counter() - start, rows)
+        return result
+
+    def __getattr__(self, name: str) -> Any:  # noqa: ANN401
+        """Pass everything else to the wrapped connection."""
+        return getattr(self._conn, name)
+
+
+METRICS = Metrics()
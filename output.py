@@ -0,0 +1,222 @@
+"""Output of the pipeline run.
+
+This module provides:
+- Output: prints the plan and the progress of a run in the selected mode, through one buffered console;
+- OUTPUT_MODES: the output modes, "rich", "compact" and "ndjson";
+- OUTPUT: the output shared by the pipeline modules, in "rich" mode until `configure` is called.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+from typing import TextIO, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+    from plan import PlanItem
+
+# "rich" prints every statement highlighted, "compact" one line per action,
+# "ndjson" one JSON event per line in a file, with only the messages on the console.
+OUTPUT_MODES = ("rich", "compact", "ndjson")
+
+# The console output is written out once this many characters are buffered...
+BUFFER_SIZE = 64 * 1024
+
+# ...or this many seconds after it was last written out, so a long run still shows its progress.
+BUFFER_SECONDS = 1.0
+
+ACTION_STYLES = {
+    "create": ("+", "Create", "green3"),
+    "alter": ("~", "Alter", "sandy_brown"),
+    "drop": ("-", "Drop", "red3"),
+}
+
+
+class _BufferedStream(io.TextIOBase):
+    """Text stream gathering the console output, written out in blocks.
+
+    The console flushes after every print, the flush is ignored and the
+    output is written when the buffer is full, when it is old, or on `drain`.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self._parts: list[str] = []
+        self._size = 0
+        self._drained_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            self._parts.append(text)
+            self._size += len(text)
+            full = self._size >= BUFFER_SIZE or time.monotonic() - self._drained_at >= BUFFER_SECONDS
+        if full:
+            self.drain()
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> None:
+        with self._lock:
+            text = "".join(self._parts)
+            self._parts.clear()
+            self._size = 0
+            self._drained_at = time.monotonic()
+        if text:
+            self.stream.write(text)
+        self.stream.flush()
+
+    def isatty(self) -> bool:
+        return self.stream.isatty()
+
+    def fileno(self) -> int:
+        return self.stream.fileno()
+
+
+class Output:
+    """Print the plan, the executed statements and the messages of a run.
+
+    Every mode writes its messages through the same console, created on the
+    first message and buffered. In "ndjson" mode the plan and the executed
+    statements are written as events to a file, line by line, so the memory
+    used does not grow with the number of changes.
+    """
+
+    def __init__(self, mode: str = "rich", path: str | None = None, stream: TextIO | None = None):
+        """Initialize the output, nothing is opened before the first message.
+
+        Args:
+            mode (str): One of OUTPUT_MODES.
+            path (str, optional): File of the events in "ndjson" mode.
+            stream (TextIO, optional): Stream of the console, the standard output by default.
+
+        """
+        self.mode = "rich"
+        self.path = None
+        self.stream = stream
+        self.counts: dict[str, int] = {}
+        self.executed_statements = 0
+        self._console: Console | None = None
+        self._buffer: _BufferedStream | None = None
+        self._events: TextIO | None = None
+        self._lock = threading.Lock()
+        self.configure(mode, path)
+
+    def configure(self, mode: str, path: str | None = None) -> None:
+        """Select the output mode, "ndjson" requires the path of the events file."""
+        mode = mode.lower()
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Invalid output mode: '{mode}', expected one of {', '.join(OUTPUT_MODES)}")  # noqa: TRY003
+        if mode == "ndjson" and not path:
+            raise ValueError("The ndjson output mode requires an output path")  # noqa: TRY003
+        self.close()
+        self.mode = mode
+        self.path = path
+        self.counts = {}
+        self.executed_statements = 0
+
+    @property
+    def console(self) -> Console:
+        """The console of every message, created on the first one."""
+        with self._lock:
+            if self._console is None:
+                from rich.console import Console  # noqa: PLC0415
+
+                self._buffer = _BufferedStream(self.stream or sys.stdout)
+                self._console = Console(file=self._buffer)
+            return self._console
+
+    def print(self, *objects: object, **kwargs: object) -> None:
+        """Print a message on the console, in every mode."""
+        self.console.print(*objects, **kwargs)
+
+    def _event(self, event: dict) -> None:
+        """Write an event line to the events file, opened on the first event."""
+        with self._lock:
+            if self._events is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._events = open(self.path, "w", encoding="utf-8")  # noqa: SIM115
+            self._events.write(json.dumps(event, separators=(",", ":"), default=str) + "\n")
+
+    def plan_item(self, item: PlanItem) -> None:
+        """Print the planned action of a resource, with its SQL in "rich" mode."""
+        with self._lock:
+            self.counts[item.iac_action] = self.counts.get(item.iac_action, 0) + 1
+
+        if self.mode == "ndjson":
+            self._event({
+                "event": "plan",
+                "node": item.node,
+                "resource_type": item.resource_type,
+                "action": item.iac_action,
+                "merged": item.merged,
+                "sql": item.sql,
+            })
+            return
+
+        symbol, title, style = ACTION_STYLES.get(item.iac_action, ("?", item.iac_action, "bold"))
+        if self.mode == "compact":
+            merged = f" (+{len(item.merged)} merged)" if item.merged else ""
+            self.print(f"[{style}]{symbol}[/{style}] {item.node}{merged}", highlight=False)
+            return
+
+        from rich.syntax import Syntax  # noqa: PLC0415
+
+        from utils import pretty_sql  # noqa: PLC0415
+
+        self.print(f"\n[bold {style}] {symbol} {title} '{item.resource_type}'[/bold {style}]")
+        if item.merged:
+            self.print(f"[bold]Merged with: {', '.join(item.merged)}[/bold]")
+        self.print(Syntax(pretty_sql(item.sql), "sql", theme="monokai", line_numbers=False))
+
+    def executed(self, node: str | None = None, statements: int = 1) -> None:
+        """Report executed statements, the ones of a resource or of a batch."""
+        with self._lock:
+            self.executed_statements += statements
+
+        if self.mode == "ndjson":
+            self._event({"event": "executed", "node": node, "statements": statements})
+        elif self.mode == "rich":
+            count = f" ({statements} statements)" if statements > 1 else ""
+            self.print(f"[bold green3]\nSQL EXECUTION SUCCESSFULL{count}[/bold green3]")
+
+    def summary(self) -> None:
+        """Print the number of planned actions and executed statements, one line in "compact" mode."""
+        counts = {action: self.counts.get(action, 0) for action in ACTION_STYLES}
+        if self.mode == "ndjson":
+            self._event({"event": "summary", **counts, "executed": self.executed_statements})
+        elif self.mode == "compact":
+            self.print(
+                f"[bold]Plan:[/bold] {counts['create']} to create, {counts['alter']} to alter, "
+                f"{counts['drop']} to drop. {self.executed_statements} statement(s) executed.",
+                highlight=False,
+            )
+
+    def flush(self) -> None:
+        """Write out the buffered console output and events."""
+        if self._buffer is not None:
+            self._buffer.drain()
+        with self._lock:
+            if self._events is not None:
+                self._events.flush()
+
+    def close(self) -> None:
+        """Write out everything and close the events file."""
+        self.flush()
+        with self._lock:
+            if self._events is not None:
+                self._events.close()
+                self._events = None
+
+
+OUTPUT = Output()
@@ -0,0 +1,527 @@
+"""Planning of the pipeline run.
+
+This module provides:
+- Planner: checks the drift of every resource and renders the SQL to execute;
+- Plan: the planned action of every resource, in dependency order;
+- PlanItem: the planned action of a single resource.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from drift import Drift
+from errors import AlterError, PlanError, PlanningError, TemplateFileError
+from executor import Executor
+from metrics import METRICS
+from tracing import TRACER
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from sqlalchemy import Connection
+    from state_cache import StateCache
+    from utils import Utils
+
+# Version of the plan file format, a plan of another version is not applied.
+PLAN_FORMAT_VERSION = 1
+
+# Keys identifying a resource, rendered in alter templates even when unchanged.
+IDENTITY_KEYS = ("name", "database", "schema", "object_id_tag")
+
+# Privileges granted on their own, they cannot be listed with other privileges.
+EXCLUSIVE_PRIVILEGES = {"ALL", "ALL PRIVILEGES", "OWNERSHIP"}
+
+# Smallest number of grants merged into one statement.
+MIN_CONSOLIDATED_GRANTS = 2
+
+
+@dataclass
+class PlanItem:
+    """Planned action of a resource.
+
+    Attributes:
+        node: The resource key, "resource_type::name".
+        resource_type: The type of the resource.
+        name: The name of the resource.
+        iac_action: One of "create", "alter", "drop" or "no-action".
+        sql: The rendered SQL to execute, None when there is nothing to execute.
+        wait_time: The maximum seconds to wait for the resource to be ready after its execution.
+        ready_query: The rendered query confirming the resource is ready, polled up to the wait time.
+        depends_on: The resources keys this resource depends on.
+        fingerprint: Hash of the normalized definition, recorded in the state cache once reconciled.
+        cached: True when the drift check was skipped because the state cache is fresh.
+        merged: Other resources whose SQL was consolidated into the SQL of this one.
+    """
+    node: str
+    resource_type: str
+    name: str
+    iac_action: str
+    sql: str | None = None
+    wait_time: int | None = None
+    ready_query: str | None = None
+    depends_on: list[str] = field(default_factory=list)
+    fingerprint: str | None = None
+    cached: bool = False
+    merged: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        """Compact representation of the item, empty fields are left out."""
+        data = {"node": self.node, "action": self.iac_action}
+        for key, value in [
+            ("sql", self.sql),
+            ("wait_time", self.wait_time),
+            ("ready_query", self.ready_query),
+            ("depends_on", self.depends_on),
+            ("fingerprint", self.fingerprint),
+            ("cached", self.cached),
+            ("merged", self.merged),
+        ]:
+            if value:
+                data[key] = value
+        return data
+
+
+@dataclass
+class Plan:
+    """Planned actions of all the resources, in dependency order.
+
+    Attributes:
+        run_mode: The run mode the plan was built for.
+        items: The planned action of every resource, keyed by "resource_type::name".
+        account_fingerprint: Hash of the account the plan was made against.
+        definitions_fingerprint: Hash of the definitions the plan was made from.
+        created_at: Unix time the plan was made.
+    """
+    run_mode: str
+    items: dict[str, PlanItem] = field(default_factory=dict)
+    account_fingerprint: str | None = None
+    definitions_fingerprint: str | None = None
+    created_at: float | None = None
+
+    def changes(self) -> list[PlanItem]:
+        """Planned items with SQL to execute, in dependency order."""
+        return [item for item in self.items.values() if item.sql]
+
+    def batches(self, batch_size: int = 1) -> list[list[PlanItem]]:
+        """Group the changes into batches of statements without ordering constraint between them.
+
+        The changes are grouped by their level in the dependency graph, a
+        resource is on the level after the deepest of its dependencies, so the
+        resources of a level never depend on each other. Resources with a wait
+        time, and SQL with dollar-quoted bodies, are in a batch of their own.
+
+        Args:
+            batch_size (int): Maximum number of statements in a batch.
+
+        Returns:
+            list: The batches to execute one after the other.
+
+        """
+        # Items are in dependency order, the dependencies have their level already.
+        levels: dict[str, int] = {}
+        for node, item in self.items.items():
+            levels[node] = 1 + max((levels[d] for d in item.depends_on if d in levels), default=-1)
+
+        by_level: dict[int, list[PlanItem]] = {}
+        for item in self.changes():
+            by_level.setdefault(levels[item.node], []).append(item)
+
+        batches = []
+        for level in sorted(by_level):
+            batchable = []
+            for item in by_level[level]:
+                if batch_size <= 1 or item.wait_time or "$$" in item.sql:
+                    batches.append([item])
+                else:
+                    batchable.append(item)
+            batches.extend(batchable[i:i + batch_size] for i in range(0, len(batchable), batch_size))
+        return batches
+
+    def resources(self, node: str) -> list[str]:
+        """The resource and the resources merged into it, whose outcome is the outcome of its SQL."""
+        return [node, *self.items[node].merged]
+
+    def d_map(self) -> dict:
+        """Dependency map of the planned resources."""
+        return {node: item.depends_on for node, item in self.items.items()}
+
+    def to_dict(self) -> dict:
+        """Compact representation of the plan, empty fields of the items are left out."""
+        return {
+            "version": PLAN_FORMAT_VERSION,
+            "run_mode": self.run_mode,
+            "account": self.account_fingerprint,
+            "definitions": self.definitions_fingerprint,
+            "created_at": self.created_at,
+            "items": [item.to_dict() for item in self.items.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> Plan:
+        """Load a plan from its compact representation."""
+        items = {}
+        for i in data["items"]:
+            resource_type, name = i["node"].split("::")
+            items[i["node"]] = PlanItem(
+                node=i["node"],
+                resource_type=resource_type,
+                name=name,
+                iac_action=i["action"],
+                sql=i.get("sql"),
+                wait_time=i.get("wait_time"),
+                ready_query=i.get("ready_query"),
+                depends_on=i.get("depends_on", []),
+                fingerprint=i.get("fingerprint"),
+                cached=i.get("cached", False),
+                merged=i.get("merged", []),
+            )
+
+        return cls(
+            run_mode=data["run_mode"],
+            items=items,
+            account_fingerprint=data.get("account"),
+            definitions_fingerprint=data.get("definitions"),
+            created_at=data.get("created_at"),
+        )
+
+    def write(self, path: str) -> None:
+        """Write the plan file."""
+        if self.created_at is None:
+            self.created_at = time.time()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> Plan:
+        """Read a plan file, raise PlanError when it is unreadable or of another version."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as err:
+            raise PlanError(path, f"unreadable plan file ({err})") from err
+
+        if data.get("version") != PLAN_FORMAT_VERSION:
+            raise PlanError(
+                path,
+                f"plan version {data.get('version')} is not the supported version {PLAN_FORMAT_VERSION}",
+            )
+
+        try:
+            return cls.from_dict(data)
+        except (KeyError, ValueError) as err:
+            raise PlanError(path, f"invalid plan file ({err})") from err
+
+    def check_fresh(self, path: str, account_fingerprint: str, definitions_fingerprint: str) -> None:
+        """Raise PlanError when the plan was made for another account or other definitions."""
+        if self.account_fingerprint != account_fingerprint:
+            raise PlanError(path, "it was made against another account")
+        if self.definitions_fingerprint != definitions_fingerprint:
+            raise PlanError(path, "the definitions changed since it was made, plan again")
+
+
+class Planner:
+    """Build the plan of a run, before anything is executed."""
+
+    def __init__(
+        self,
+        utils: Utils,
+        db_sys_resources: dict,
+        run_mode: str,
+        state_cache: StateCache | None = None,
+    ):
+        """Initialize the planner.
+
+        Args:
+            utils (Utils): Utils instance holding the parsed definitions.
+            db_sys_resources (dict): The resources config of the database system.
+            run_mode (str): The run mode, "create-or-update" or "destroy".
+            state_cache (StateCache, optional): Skips the drift check of unchanged, recently reconciled resources.
+
+        """
+        self.utils = utils
+        self.db_sys_resources = db_sys_resources
+        self.run_mode = run_mode.lower()
+        self.state_cache = state_cache
+
+    def load_state_snapshots(self, drift: Drift, resource_types: set[str]) -> None:
+        """Fetch the state of the resource types that have a bulk state query, one query per type."""
+        for resource_type in sorted(resource_types):
+            bulk_state_query = self.db_sys_resources.get(resource_type, {}).get("bulk_state_query")
+            if bulk_state_query:
+                with TRACER.span(resource_type, "state_snapshot"), METRICS.labels(resource_type):
+                    drift.load_state_snapshot(
+                        resource_type=resource_type,
+                        query=self.utils.render_templates(template=bulk_state_query),
+                    )
+
+    def load_role_grants(self, drift: Drift, nodes: list[str]) -> None:
+        """Fetch the grants of every role granted to by the grants, one query per role."""
+        role_grants_query = self.db_sys_resources.get("grant", {}).get("role_grants_query")
+        if not role_grants_query:
+            return
+
+        roles = {
+            str(self.utils.definitions_index[node].get("to_role", "")).upper()
+            for node in nodes
+            if node.split("::")[0] == "grant"
+        }
+        for role in sorted(roles - {""}):
+            with TRACER.span(role, "role_grants"), METRICS.labels("grant"):
+                drift.load_role_grants(
+                    role=role,
+                    query=self.utils.render_templates(template=role_grants_query, name=role),
+                )
+
+    def _is_cached(self, node: str, drift: Drift) -> bool:
+        """True when the drift check of the resource is skipped thanks to the state cache."""
+        if self.state_cache is None or self.run_mode != "create-or-update":
+            return False
+        fingerprint = drift.definition_fingerprint(self.utils.definitions_index[node])
+        return self.state_cache.is_fresh(node, fingerprint)
+
+    def resource_drift(self, node: str, drift: Drift) -> dict:
+        """Compare the definition of a resource with its state, read in bulk when possible."""
+        resource_type, resource_name = node.split("::")
+        rsc = self.utils.definitions_index[node]
+        rsc_config = self.db_sys_resources.get(resource_type, {})
+
+        if rsc_config.get("role_grants_query"):
+            # Grants are resolved against the grants of their role, fetched in bulk.
+            return drift.grant_state(definition=rsc)
+
+        rsc_state_query = None
+        covered = drift.snapshot_covers(definition=rsc, name=resource_name, resource_type=resource_type)
+        if not covered:
+            rsc_state_query = self.utils.render_templates(
+                template=rsc_config["state_query"],
+                name=resource_name,
+                definition=rsc,
+            )
+
+        return drift.resource_state(
+            definition=rsc,
+            state_query=rsc_state_query,
+            name=resource_name,
+            resource_type=resource_type,
+            covered=covered,
+            )
+
+    def plan_resource(self, node: str, drift: Drift, depends_on: list[str] | None = None) -> PlanItem:
+        """Check the drift of a resource and render the SQL of its planned action."""
+        resource_type, resource_name = node.split("::")
+
+        # Definitions were already parsed while mapping the dependencies.
+        rsc = self.utils.definitions_index[node]
+        rsc_config = self.db_sys_resources.get(resource_type, {})
+
+        item = PlanItem(
+            node=node,
+            resource_type=resource_type,
+            name=resource_name,
+            iac_action="no-action",
+            wait_time=rsc.get("wait_time", None),
+            depends_on=list(depends_on or []),
+        )
+
+        try:
+            # Unchanged definitions reconciled within the ttl of the cache are not checked again.
+            if self.state_cache is not None and self.run_mode == "create-or-update":
+                item.fingerprint = drift.definition_fingerprint(rsc)
+                if self.state_cache.is_fresh(node, item.fingerprint):
+                    item.cached = True
+                    return item
+
+            with TRACER.span(node, "drift", node=node), METRICS.labels(resource_type):
+                rsc_drift = self.resource_drift(node, drift)
+
+            with TRACER.span(node, "render", node=node):
+                if self.run_mode == "create-or-update":
+                    # If there is no drift, then it is a new object.
+                    # If the object drifted, alter the properties of the object.
+                    # Do nothing if the the object has not drifted, definition and the state are the same.
+                    if rsc_drift["iac_action"] in {"create", "alter"}:
+                        item.iac_action = rsc_drift["iac_action"]
+                        definition = rsc_drift["definition"]
+                        if item.iac_action == "alter":
+                            # Alter templates get the changed values, the unchanged ones are None.
+                            definition = {
+                                **dict.fromkeys(rsc),
+                                **{k: rsc[k] for k in IDENTITY_KEYS if k in rsc},
+                                **definition,
+                            }
+                        item.sql = self.utils.render_templates(
+                            template=rsc_config["template"],
+                            definition=definition,
+                            name=resource_name,
+                            iac_action=rsc_config["iac_action"][item.iac_action],
+                        )
+
+                        # The resource is ready when its readiness query, or else its
+                        # state query, returns a value. It is rendered from the same
+                        # definition as the statement, so it names the created resource.
+                        ready_template = rsc_config.get("ready_query") or rsc_config.get("state_query")
+                        if item.wait_time and ready_template:
+                            item.ready_query = self.utils.render_templates(
+                                template=ready_template,
+                                name=resource_name,
+                                definition=definition,
+                            )
+
+                # Only resources that exist in the database are dropped.
+                elif self.run_mode == "destroy" and rsc_drift["iac_action"] != "create":
+                    item.iac_action = "drop"
+                    item.sql = self.utils.render_templates(
+                        template=rsc_config["template"],
+                        definition=rsc,
+                        name=resource_name,
+                        iac_action=rsc_config["iac_action"]["drop"],
+                    )
+
+        except AlterError:
+            raise
+        except Exception as err:
+            raise TemplateFileError(resource_name, self.utils.resources_path, err) from err
+
+        if item.iac_action == "alter" and not item.sql:
+            # A drift rendering no statement would be dropped from the plan.
+            raise AlterError(name=node, changes=", ".join(sorted(rsc_drift["definition"])))
+
+        return item
+
+    def consolidate_grants(self, plan: Plan) -> Plan:
+        """Merge the grants of the plan that differ only in their privilege into one statement.
+
+        Grants of the same privileges on the same object to the same role,
+        with the same grant option and action, are rendered as one GRANT or
+        REVOKE listing every privilege. Only grants no other resource depends
+        on are merged, so the merged statement cannot delay another resource.
+        The merged statement takes the place of the last of its grants in the
+        dependency order and depends on the dependencies of all of them.
+
+        Args:
+            plan (Plan): The plan built by this planner.
+
+        Returns:
+            Plan: The plan with the merged grants, the other grants keep no SQL.
+
+        """
+        rsc_config = self.db_sys_resources.get("grant")
+        if not rsc_config:
+            return plan
+
+        depended_on = {dependency for item in plan.items.values() for dependency in item.depends_on}
+        groups: dict[tuple, list[PlanItem]] = {}
+        for item in plan.changes():
+            if item.resource_type != "grant" or item.node in depended_on:
+                continue
+            if item.iac_action not in {"create", "drop"}:
+                continue
+            definition = self.utils.definitions_index[item.node]
+            if str(definition.get("privilege", "")).upper() in EXCLUSIVE_PRIVILEGES:
+                continue
+
+            key = (
+                item.iac_action,
+                str(definition.get("on_object_type", "")).upper(),
+                str(definition.get("on_object", "")).upper(),
+                str(definition.get("to_role", "")).upper(),
+                bool(definition.get("with_grant_option")),
+            )
+            groups.setdefault(key, []).append(item)
+
+        for grants in groups.values():
+            if len(grants) < MIN_CONSOLIDATED_GRANTS:
+                continue
+
+            # The last grant in dependency order comes after the dependencies of all of them.
+            target = grants[-1]
+            privileges = []
+            for grant in grants:
+                privilege = str(self.utils.definitions_index[grant.node]["privilege"]).upper()
+                if privilege not in privileges:
+                    privileges.append(privilege)
+
+            try:
+                target.sql = self.utils.render_templates(
+                    template=rsc_config["template"],
+                    definition={
+                        **self.utils.definitions_index[target.node],
+                        "privilege": ", ".join(privileges),
+                    },
+                    name=target.name,
+                    iac_action=rsc_config["iac_action"][target.iac_action],
+                )
+            except Exception as err:
+                raise TemplateFileError(target.name, self.utils.resources_path, err) from err
+
+            for grant in grants[:-1]:
+                grant.sql = None
+                target.merged.append(grant.node)
+                target.depends_on.extend(d for d in grant.depends_on if d not in target.depends_on)
+
+        return plan
+
+    def build(
+        self,
+        sorted_map: list[str],
+        d_map: dict,
+        drift: Drift,
+        max_workers: int = 1,
+        connection_factory: Callable[[], Connection] | None = None,
+    ) -> Plan:
+        """Plan every resource of the sorted map.
+
+        The state queries are read-only and independent, with more than one
+        worker they run concurrently, each worker with its own connection.
+
+        Args:
+            sorted_map (list): Resources keys in dependency order.
+            d_map (dict): Dependency map of the resources.
+            drift (Drift): Drift instance holding the state snapshots, used as is when planning serially.
+            max_workers (int): Maximum number of resources planned at the same time.
+            connection_factory (Callable, optional): Opens a database connection for each worker.
+
+        Returns:
+            Plan: The planned action of every resource in dependency order.
+
+        """
+        # Only the resources to check need their bulk state.
+        unchecked = [node for node in sorted_map if not self._is_cached(node, drift)]
+        self.load_state_snapshots(drift, {node.split("::")[0] for node in unchecked})
+        self.load_role_grants(drift, unchecked)
+
+        if max_workers > 1 and connection_factory is not None:
+            items = {}
+
+            def task(node: str, conn: Connection) -> None:
+                worker_drift = Drift(
+                    conn=conn,
+                    state_snapshots=drift.state_snapshots,
+                    role_grants=drift.role_grants,
+                    snapshot_databases=drift.snapshot_databases,
+                )
+                items[node] = self.plan_resource(node, worker_drift, d_map.get(node))
+
+            # A graph without edges, every state query can run at the same time.
+            result = Executor(
+                d_map=dict.fromkeys(sorted_map, []),
+                max_workers=max_workers,
+                connection_factory=connection_factory,
+            ).run(task)
+
+            if len(result.failed) == 1:
+                # A single failure is raised as is, as when planning serially.
+                raise next(iter(result.failed.values()))
+            if result.failed:
+                raise PlanningError(failed=result.failed)
+        else:
+            items = {node: self.plan_resource(node, drift, d_map.get(node)) for node in sorted_map}
+
+        return Plan(
+            run_mode=self.run_mode,
+            items={node: items[node] for node in sorted_map},
+        )
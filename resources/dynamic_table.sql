@@ -14,7 +14,7 @@ TARGET_LAG = '{{ target_lag }}'
 {% if data_retention_time_in_days %}DATA_RETENTION_TIME_IN_DAYS = {{ data_retention_time_in_days }} {% endif %}
 {% if max_data_extension_time_in_days %}MAX_DATA_EXTENSION_TIME_IN_DAYS = {{ max_data_extension_time_in_days }} {% endif %}
 COMMENT = '{"comment":"{{ comment }}", "object_id_tag": "{{ object_id_tag }}"}'
-AS {{ query }};
+AS {{ as_ }};
 
 {% if not suspended %}
 ALTER DYNAMIC TABLE {{ name }} RESUME;
@@ -25,20 +25,25 @@ ALTER DYNAMIC TABLE {{ name }} RESUME;
 
 {% elif iac_action.upper() == 'ALTER' %}
 
-{% if suspended %}
+{% if suspended is true %}
 {{ iac_action }} DYNAMIC TABLE {{ name }} SUSPEND;
-{% endif %}
-
-{% if not suspended %}
-ALTER DYNAMIC TABLE {{ name }} RESUME;
+{% elif suspended is false %}
+{{ iac_action }} DYNAMIC TABLE {{ name }} RESUME;
 {% endif %}
 
 {% if target_lag or warehouse or data_retention_time_in_days or max_data_extension_time_in_days %}
-ALERT DYNAMIC TABLE {{ name }} SET
+{{ iac_action }} DYNAMIC TABLE {{ name }} SET
 {% if warehouse %}WAREHOUSE = {{ warehouse }}{% endif %}
 {% if target_lag %}TARGET_LAG = '{{ target_lag }}'{% endif %}
 {% if data_retention_time_in_days %}DATA_RETENTION_TIME_IN_DAYS = {{ data_retention_time_in_days }} {% endif %}
-{% if max_data_extension_time_in_days %}MAX_DATA_EXTENSION_TIME_IN_DAYS = {{ max_data_extension_time_in_days }} {% endif %}
+{% if max_data_extension_time_in_days %}MAX_DATA_EXTENSION_TIME_IN_DAYS = {{ max_data_extension_time_in_days }} {% endif %};
+{% endif %}
+
+{# The columns of a dynamic table come from its query, only their comments are altered. #}
+{% if columns %}
+{% for column in columns.changed if 'comment' in column.changed %}
+COMMENT ON COLUMN {{ name }}.{{ column.name }} IS '{{ column.comment }}';
+{% endfor %}
 {% endif %}
 
 {% endif -%}
\ No newline at end of file
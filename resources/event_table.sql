@@ -13,9 +13,18 @@ COMMENT = '{"comment":"{{ comment }}", "object_id_tag": "{{ object_id_tag }}"}';
 ALTER EVENT TABLE {{ old_name }} RENAME TO {{ new_name }};
 
 {% elif iac_action.upper() == 'ALTER' %}
-ALTER EVENT TABLE SET
+{% if data_retention_time_in_days or max_data_extension_time_in_days or change_tracking is not none %}
+ALTER EVENT TABLE {{ name }} SET
 {% if data_retention_time_in_days %} DATA_RETENTION_TIME_IN_DAYS = {{ data_retention_time_in_days }}{% endif %}
 {% if max_data_extension_time_in_days %} MAX_DATA_EXTENSION_TIME_IN_DAYS = {{ max_data_extension_time_in_days }}{% endif %}
-{% if change_tracking|string|upper !="" %}CHANGE_TRACKING = {{ change_tracking|string|upper }}{% endif %}
+{% if change_tracking is not none %}CHANGE_TRACKING = {{ change_tracking|string|upper }}{% endif %};
+{% endif %}
+
+{# The columns of an event table are predefined, only their comments are altered. #}
+{% if columns %}
+{% for column in columns.changed if 'comment' in column.changed %}
+COMMENT ON COLUMN {{ name }}.{{ column.name }} IS '{{ column.comment }}';
+{% endfor %}
+{% endif %}
 
 {% endif -%}
\ No newline at end of file
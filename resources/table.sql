@@ -14,11 +14,41 @@ COMMENT = '{"comment":"{{ comment }}", "object_id_tag": "{{ object_id_tag }}"}';
 {% elif iac_action.upper() == 'ALTER' and new_name %}
 {{ iac_action }} TABLE {{ old_name }} RENAME TO {{ new_name }};
 
-{% elif iac_action.upper() == 'ALTER' and comment %}
+{% elif iac_action.upper() == 'ALTER' %}
+{% if columns %}
+{% for column in columns.added %}
+{{ iac_action }} TABLE {{ name }} ADD COLUMN {{ column.name }} {{ column.type }}
+{%- if column.nullable is false %} NOT NULL {%- endif %}
+{%- if column.default is not none and column.default != '' %} DEFAULT {{ column.default }} {%- endif %}
+{%- if column.comment %} COMMENT '{{ column.comment }}' {%- endif %};
+{% endfor %}
+{% for column in columns.removed %}
+{{ iac_action }} TABLE {{ name }} DROP COLUMN {{ column.name }};
+{% endfor %}
+{% for column in columns.changed %}
+{% if 'type' in column.changed %}
+{{ iac_action }} TABLE {{ name }} ALTER COLUMN {{ column.name }} SET DATA TYPE {{ column.type }};
+{% endif %}
+{% if 'nullable' in column.changed %}
+{{ iac_action }} TABLE {{ name }} ALTER COLUMN {{ column.name }} {% if column.nullable %}DROP{% else %}SET{% endif %} NOT NULL;
+{% endif %}
+{% if 'default' in column.changed %}
+{{ iac_action }} TABLE {{ name }} ALTER COLUMN {{ column.name }} {% if column.default is none %}DROP DEFAULT{% else %}SET DEFAULT {{ column.default }}{% endif %};
+{% endif %}
+{% if 'comment' in column.changed %}
+{{ iac_action }} TABLE {{ name }} ALTER COLUMN {{ column.name }} COMMENT '{{ column.comment }}';
+{% endif %}
+{% endfor %}
+{% endif %}
+{% if cluster_by %}
+{{ iac_action }} TABLE {{ name }} CLUSTER BY ({{ cluster_by | join(', ') }});
+{% endif %}
+{% if comment %}
 {{ iac_action }} TABLE {{ name }} SET
 COMMENT = '{"comment":"{{ comment }}", "object_id_tag": "{{ object_id_tag }}"}';
+{% endif %}
 
 {% elif iac_action.upper() == 'DROP' %}
 {{ iac_action }} TABLE {{ name }};
 
-{% endif -%}
\ No newline at end of file
+{% endif -%}
@@ -0,0 +1,76 @@
+"""Local state cache of the pipeline.
+
+This module provides:
+- StateCache: fingerprints of the resources definitions and the time they were last reconciled with the database.
+"""
+
+import json
+import os
+import threading
+import time
+
+# Version of the state cache file format, a cache of another version is ignored.
+STATE_CACHE_VERSION = 1
+
+
+class StateCache:
+    """Skip the drift check of resources whose definition did not change since they were last reconciled."""
+
+    def __init__(self, path: str, ttl: float = 86400, *, refresh: bool = False):
+        """Load the state cache file, starting empty when it is missing or unreadable.
+
+        Args:
+            path (str): Path of the state cache file.
+            ttl (float): Seconds a reconciled resource is trusted without a drift check.
+            refresh (bool): Force a drift check of every resource, the cache is only written.
+
+        """
+        self.path = path
+        self.ttl = ttl
+        self.refresh = refresh
+        self.resources: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == STATE_CACHE_VERSION:
+                self.resources = data.get("resources", {})
+        except (OSError, json.JSONDecodeError, AttributeError):
+            self.resources = {}
+
+    def is_fresh(self, node: str, fingerprint: str) -> bool:
+        """True when the resource definition is unchanged and was reconciled within the ttl."""
+        if self.refresh:
+            return False
+
+        entry = self.resources.get(node)
+        if not entry or entry.get("hash") != fingerprint:
+            return False
+        return time.time() - entry.get("reconciled_at", 0) <= self.ttl
+
+    def record(self, node: str, fingerprint: str) -> None:
+        """Store the fingerprint of a resource that now matches its definition."""
+        with self._lock:
+            self.resources[node] = {
+                "hash": fingerprint,
+                "reconciled_at": time.time(),
+            }
+
+    def forget(self, node: str) -> None:
+        """Remove a resource from the cache, e.g. once it is dropped."""
+        with self._lock:
+            self.resources.pop(node, None)
+
+    def save(self) -> None:
+        """Write the state cache file."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock, open(self.path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": STATE_CACHE_VERSION, "resources": self.resources},
+                f,
+                separators=(",", ":"),
+            )
@@ -0,0 +1,65 @@
+"""Unit test module."""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from connection import ConnectionManager, POOL_RECYCLE
+from utils import Utils
+
+
+class TestConnectionManager(unittest.TestCase):
+    """Unit tests for the ConnectionManager class."""
+
+    def setUp(self):
+        """Set up the Utils loader of the engine arguments."""
+        self.utils = Utils(
+            resources_path="resources.toml",
+            definitions_path="definitions",
+        )
+
+    def test_engine_arguments_loaded_once(self):
+        """Test that the engine is created once and its connections are reused and counted."""
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp, 'pool.db')}"
+            with patch.object(
+                Utils, "engine_arguments", return_value=(url, {"timeout": 1}),
+            ) as mock_arguments:
+                connections = ConnectionManager(self.utils, "sqlite", concurrency=2)
+                for _ in range(3):
+                    conn = connections.connect()
+                    conn.exec_driver_sql("SELECT 1")
+                    conn.close()
+
+                other = connections.connect()
+                self.assertEqual(other.exec_driver_sql("SELECT 1").scalar(), 1)
+                other.close()
+                connections.dispose()
+
+        mock_arguments.assert_called_once_with("sqlite")
+        self.assertEqual(connections.stats.checkouts, 4)
+        self.assertGreaterEqual(connections.stats.max_wait_seconds, 0)
+        self.assertEqual(connections.stats.to_dict()["checkouts"], 4)
+
+    def test_pool_sized_to_concurrency_with_keepalive(self):
+        """Test that the pool holds a connection per worker and the main thread, kept alive and recycled."""
+        with patch.object(
+            Utils, "engine_arguments", return_value=("snowflake://", {"account": "acme"}),
+        ), patch("sqlalchemy.create_engine") as mock_create_engine:
+            connections = ConnectionManager(self.utils, "snowflake", concurrency=4)
+            connections.connect()
+
+        kwargs = mock_create_engine.call_args.kwargs
+        self.assertEqual(kwargs["pool_size"], 5)
+        self.assertEqual(kwargs["max_overflow"], 0)
+        self.assertEqual(kwargs["pool_recycle"], POOL_RECYCLE)
+        self.assertTrue(kwargs["pool_pre_ping"])
+        self.assertEqual(
+            kwargs["connect_args"],
+            {"client_session_keep_alive": True, "account": "acme"},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,7 @@ import unittest
 from unittest.mock import patch, MagicMock
 
 from drift import Drift, CheckResult
-from errors import DefinitionKeyError
+from errors import DefinitionKeyError, SQLExecutionError
 
 from sqlalchemy import create_engine
 
@@ -166,6 +166,162 @@ class TestDrift(unittest.TestCase):
         f"\nExpected:\n{expected_output}" \
         f"\nGot:\n{result}"
 
+    def test_load_state_snapshot(self):
+        """Test fetching the state of every table with one bulk query."""
+        bulk_state_query = """
+        SELECT json_object(
+            'name', m.name,
+            'database', 'main',
+            'schema', 'main',
+            'owner', 'sqlite',
+            'columns', (
+                SELECT json_group_array(
+                    json_object(
+                        'name', p.name,
+                        'type', p.type,
+                        'nullable', CASE WHEN p."notnull" = 0 THEN 1 ELSE 0 END,
+                        'default', p."dflt_value"
+                    )
+                )
+                FROM pragma_table_info(m.name) p
+            )
+        ) as table_metadata
+        FROM sqlite_master m
+        WHERE m.type = 'table'
+        """
+
+        definition = {
+            "name": "actors",
+            "database": "main",
+            "schema": "main",
+            "owner": "sqlite",
+            "depends_on": {},
+            "columns": [
+                {"name": "id", "type": "INTEGER", "nullable": 1, "default": None},
+                {"name": "name", "type": "TEXT", "nullable": 0, "default": None},
+            ],
+        }
+
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as conn:
+            conn.exec_driver_sql("CREATE TABLE actors (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+            conn.exec_driver_sql("CREATE TABLE films (id INTEGER PRIMARY KEY)")
+
+            drift = Drift(conn=conn)
+            snapshot = drift.load_state_snapshot(resource_type="table", query=bulk_state_query)
+
+            self.assertEqual(sorted(snapshot), [("MAIN", "MAIN", "ACTORS"), ("MAIN", "MAIN", "FILMS")])
+
+            # The state is read from the snapshot, no state query is executed.
+            with patch("drift.Drift._fetch_state_query") as mock_fetch:
+                existing = drift.resource_state(
+                    definition=definition,
+                    state_query=None,
+                    name="actors",
+                    resource_type="table",
+                )
+                missing = drift.resource_state(
+                    definition={**definition, "name": "directors"},
+                    state_query=None,
+                    name="directors",
+                    resource_type="table",
+                )
+                mock_fetch.assert_not_called()
+
+        self.assertEqual(existing["iac_action"], "no-action")
+        self.assertEqual(missing["iac_action"], "create")
+
+    def test_state_snapshot_keyed_by_schema(self):
+        """Test that tables of the same name in different schemas keep their own state."""
+        bulk_state_query = """
+        SELECT json_object('name', 'films', 'database', 'analytics', 'schema', 'staging', 'owner', 'loader')
+        UNION ALL
+        SELECT json_object('name', 'films', 'database', 'analytics', 'schema', 'reporting', 'owner', 'bi')
+        """
+        definition = {"name": "films", "database": "analytics", "schema": "reporting", "owner": "bi", "depends_on": {}}
+
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as conn:
+            drift = Drift(conn=conn)
+            snapshot = drift.load_state_snapshot(resource_type="table", query=bulk_state_query)
+            self.assertEqual(len(snapshot), 2)
+
+            with patch("drift.Drift._fetch_state_query") as mock_fetch:
+                reporting = drift.resource_state(
+                    definition=definition,
+                    state_query=None,
+                    name="films",
+                    resource_type="table",
+                )
+                staging = drift.resource_state(
+                    definition={**definition, "schema": "staging"},
+                    state_query=None,
+                    name="films",
+                    resource_type="table",
+                )
+                mock_fetch.assert_not_called()
+
+                # The bulk query does not read the other databases, their state is queried.
+                mock_fetch.return_value = None
+                other_database = drift.resource_state(
+                    definition={**definition, "database": "finance"},
+                    state_query="SELECT 1",
+                    name="films",
+                    resource_type="table",
+                )
+                mock_fetch.assert_called_once_with("SELECT 1")
+
+        self.assertEqual(reporting["iac_action"], "no-action")
+        self.assertEqual(staging["iac_action"], "alter")
+        self.assertEqual(staging["definition"], {"owner": "BI"})
+        self.assertEqual(other_database["iac_action"], "create")
+
+    def test_grant_state_from_role_grants(self):
+        """Test resolving grants in memory against the grants of their role fetched with one query."""
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as conn:
+            # The columns of SHOW GRANTS TO ROLE.
+            conn.exec_driver_sql(
+                "CREATE TABLE role_grants (privilege TEXT, granted_on TEXT, name TEXT, grantee_name TEXT, grant_option TEXT)",
+            )
+            conn.exec_driver_sql(
+                "INSERT INTO role_grants VALUES "
+                "('SELECT', 'TABLE', 'DB.SCH.\"ORDERS\"', 'BI_ADMIN', 'false'), "
+                "('USAGE', 'WAREHOUSE', 'BI_WH', 'BI_ADMIN', 'true')",
+            )
+
+            drift = Drift(conn=conn)
+            grants = drift.load_role_grants(
+                role="bi_admin",
+                query="SELECT * FROM role_grants WHERE grantee_name = 'BI_ADMIN'",
+            )
+            # A role that does not exist yet has no grants.
+            with patch.object(drift, "conn") as mock_conn:
+                mock_conn.exec_driver_sql.side_effect = Exception(
+                    "SQL compilation error: Role 'NEW_ROLE' does not exist or not authorized.",
+                )
+                drift.load_role_grants(role="new_role", query="SHOW GRANTS TO ROLE new_role")
+            # Any other error is raised, the grants of the role are not assumed absent.
+            with self.assertRaises(SQLExecutionError):
+                drift.load_role_grants(role="bi_admin", query="SHOW GRANTS TO ROLE bi_admin")
+
+        self.assertEqual(len(grants), 2)
+        self.assertEqual(drift.role_grants["NEW_ROLE"], set())
+
+        grant = {
+            "name": "orders_select",
+            "privilege": "select",
+            "on_object_type": "table",
+            "on_object": "db.sch.orders",
+            "to_role": "bi_admin",
+            "with_grant_option": False,
+            "depends_on": {},
+        }
+        self.assertEqual(drift.grant_state(grant)["iac_action"], "no-action")
+        self.assertEqual(drift.grant_state({**grant, "with_grant_option": True})["iac_action"], "create")
+        self.assertEqual(drift.grant_state({**grant, "privilege": "insert"})["iac_action"], "create")
+        self.assertEqual(drift.grant_state({**grant, "to_role": "new_role"})["iac_action"], "create")
+
     def test_check_keys(self):
 
         expected_state = {
@@ -342,20 +498,63 @@ class TestDrift(unittest.TestCase):
         expected_output = {
             "schema": "new_schema",
             "comment": {"msg":"new_msg"},
+            "columns": {
+                "added": [
+                    {
+                        "name": "new_column",
+                        "type": "int",
+                        "nullable": "",
+                        "default": 0,
+                        "comment": "",
+                    },
+                ],
+                "removed": [],
+                "changed": [],
+            },
+        }
+
+        self.assertEqual(
+            result.diff,
+            expected_output,
+        )
+
+    def test_check_values_column_level_diff(self):
+        """Test that named list items are compared by name and scalar lists as sets."""
+        definition = {
+            "name": "ORDERS",
+            "allowed_roles": ["ANALYST", "ADMIN"],
+            "blocked_roles": ["PUBLIC"],
             "columns": [
-                {
-                    "name": "new_column",
-                    "type": "int",
-                    "nullable": "",
-                    "default": 0,
-                    "comment": "",
-                },
+                {"name": "ID", "type": "NUMBER", "nullable": False, "comment": ""},
+                {"name": "AMOUNT", "type": "FLOAT", "nullable": True, "comment": "EUR"},
+                {"name": "CREATED_AT", "type": "TIMESTAMP", "nullable": True, "comment": ""},
             ],
         }
+        state = {
+            "name": "ORDERS",
+            "allowed_roles": ["ADMIN", "ANALYST"],
+            "blocked_roles": ["PUBLIC", "SYSADMIN"],
+            "columns": [
+                {"name": "LEGACY", "type": "TEXT", "nullable": True, "comment": None},
+                {"name": "AMOUNT", "type": "NUMBER", "nullable": True, "comment": None},
+                {"name": "ID", "type": "NUMBER", "nullable": False, "comment": "KEY"},
+            ],
+        }
+
+        result = Drift(conn=MagicMock())._check_values(definition=definition, state=state)
 
+        self.assertFalse(result.match)
         self.assertEqual(
             result.diff,
-            expected_output,
+            {
+                # Same roles in another order are no drift.
+                "blocked_roles": ["PUBLIC"],
+                "columns": {
+                    "added": [definition["columns"][2]],
+                    "removed": [state["columns"][0]],
+                    "changed": [{**definition["columns"][1], "changed": ["type", "comment"]}],
+                },
+            },
         )
 
 
@@ -0,0 +1,249 @@
+"""Unit test module."""
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+
+from errors import ReadinessError, SQLExecutionError
+from executor import Executor, LocalBackend, StatementBackend
+
+
+class FakeBackend(StatementBackend):
+    """Backend where every statement finishes after a number of status checks."""
+
+    def __init__(self, polls_to_finish=2, failing=None):
+        """Initialize the fake with the statements that fail."""
+        self.polls_to_finish = polls_to_finish
+        self.failing = failing or set()
+        self.submitted = []
+        self.finished = []
+        self.max_in_flight = 0
+        self._polls = {}
+
+    def submit(self, sql):
+        """Record the statement and return its position as the query ID."""
+        query_id = str(len(self.submitted))
+        self.submitted.append(sql)
+        self._polls[query_id] = 0
+        self.max_in_flight = max(self.max_in_flight, len(self._polls))
+        return query_id
+
+    def is_done(self, query_id):
+        """Finish the statement after the configured number of status checks."""
+        self._polls[query_id] += 1
+        if self._polls[query_id] < self.polls_to_finish:
+            return False
+        del self._polls[query_id]
+        sql = self.submitted[int(query_id)]
+        if sql in self.failing:
+            raise ValueError(f"{sql} failed")
+        self.finished.append(sql)
+        return True
+
+
+class TestExecutor(unittest.TestCase):
+    """Unit tests for the Executor class."""
+
+    def setUp(self):
+        """Set up a dependency map with two independent branches."""
+        self.d_map = {
+            "database::analytics": ["role::bi_admin_role"],
+            "schema::reporting": ["database::analytics"],
+            "role::bi_admin_role": [],
+            "warehouse::bi_wh": [],
+            "user::god": ["warehouse::bi_wh"],
+        }
+
+    def test_run_respects_dependencies(self):
+        """Test that every resource starts only after all its dependencies are done."""
+        finished = []
+        lock = threading.Lock()
+
+        def task(node, _conn):
+            for dependency in self.d_map[node]:
+                assert dependency in finished, f"{node} started before {dependency}"
+            time.sleep(0.01)
+            with lock:
+                finished.append(node)
+
+        result = Executor(d_map=self.d_map, max_workers=3).run(task)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(sorted(result.succeeded), sorted(self.d_map))
+
+    def test_run_executes_independent_resources_concurrently(self):
+        """Test that independent resources run at the same time on the worker pool."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def task(node, _conn):
+            # Both roots must be running at the same time to pass the barrier.
+            if node in {"role::bi_admin_role", "warehouse::bi_wh"}:
+                barrier.wait()
+
+        result = Executor(d_map=self.d_map, max_workers=2).run(task)
+
+        self.assertTrue(result.ok)
+
+    def test_run_failure_skips_only_downstream(self):
+        """Test that a failing resource skips its dependents and the other branch still runs."""
+        def task(node, _conn):
+            if node == "database::analytics":
+                raise ValueError("boom")
+
+        result = Executor(d_map=self.d_map, max_workers=2).run(task)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(list(result.failed), ["database::analytics"])
+        self.assertEqual(result.skipped, ["schema::reporting"])
+        self.assertEqual(
+            sorted(result.succeeded),
+            ["role::bi_admin_role", "user::god", "warehouse::bi_wh"],
+        )
+
+    def test_run_opens_one_connection_per_worker(self):
+        """Test that each worker opens a single connection and all are closed at the end."""
+        connections = []
+
+        def connection_factory():
+            conn = MagicMock()
+            connections.append(conn)
+            return conn
+
+        seen = {}
+
+        def task(node, conn):
+            seen[node] = conn
+
+        Executor(
+            d_map=self.d_map,
+            max_workers=2,
+            connection_factory=connection_factory,
+        ).run(task)
+
+        self.assertLessEqual(len(connections), 2)
+        self.assertEqual(set(map(id, seen.values())), set(map(id, connections)))
+        for conn in connections:
+            conn.close.assert_called_once()
+
+    def test_run_async_keeps_independent_statements_in_flight(self):
+        """Test that independent statements are submitted together and dependents wait for completion."""
+        backend = FakeBackend()
+        statements = {node: f"SQL {node}" for node in self.d_map}
+        statements["warehouse::bi_wh"] = None
+
+        result = Executor(d_map=self.d_map, max_workers=4).run_async(
+            backend=backend,
+            statements=statements,
+            poll_interval=0,
+        )
+
+        self.assertTrue(result.ok)
+        self.assertEqual(sorted(result.succeeded), sorted(self.d_map))
+        self.assertNotIn(None, backend.submitted)
+        # The role and the user do not depend on each other, both are in flight together.
+        self.assertEqual(backend.max_in_flight, 2)
+        for node, dependencies in self.d_map.items():
+            for dependency in dependencies:
+                if statements[dependency] and statements[node]:
+                    self.assertLess(
+                        backend.finished.index(statements[dependency]),
+                        backend.submitted.index(statements[node]),
+                    )
+
+    def test_run_async_failure_skips_only_downstream(self):
+        """Test that a failed query is reported as SQLExecutionError and only its dependents are skipped."""
+        backend = FakeBackend(failing={"SQL database::analytics"})
+        statements = {node: f"SQL {node}" for node in self.d_map}
+
+        result = Executor(d_map=self.d_map).run_async(
+            backend=backend,
+            statements=statements,
+            poll_interval=0,
+        )
+
+        self.assertEqual(list(result.failed), ["database::analytics"])
+        self.assertIsInstance(result.failed["database::analytics"], SQLExecutionError)
+        self.assertEqual(result.skipped, ["schema::reporting"])
+        self.assertNotIn("SQL schema::reporting", backend.submitted)
+
+    @patch("executor.READY_POLL_INTERVAL", 0.01)
+    def test_run_async_waits_for_readiness_of_dependencies_only(self):
+        """Test that only the dependents of a resource wait until its readiness check succeeds."""
+        backend = FakeBackend(polls_to_finish=1)
+        statements = {node: f"SQL {node}" for node in self.d_map}
+        probes = []
+
+        def warehouse_ready():
+            probes.append(list(backend.submitted))
+            return len(probes) >= 3
+
+        result = Executor(d_map=self.d_map).run_async(
+            backend=backend,
+            statements=statements,
+            ready_checks={"warehouse::bi_wh": (warehouse_ready, 60)},
+            poll_interval=0,
+        )
+
+        self.assertTrue(result.ok)
+        self.assertEqual(len(probes), 3)
+        # The user waits for the warehouse, the database branch does not.
+        self.assertNotIn("SQL user::god", probes[-1])
+        self.assertIn("SQL schema::reporting", probes[-1])
+        self.assertIn("SQL user::god", backend.submitted)
+
+    def test_run_async_readiness_timeout(self):
+        """Test that a resource never ready fails with ReadinessError and skips its dependents."""
+        result = Executor(d_map=self.d_map).run_async(
+            backend=FakeBackend(polls_to_finish=1),
+            statements={node: f"SQL {node}" for node in self.d_map},
+            ready_checks={"warehouse::bi_wh": (lambda: False, 0.05)},
+            poll_interval=0,
+        )
+
+        self.assertIsInstance(result.failed["warehouse::bi_wh"], ReadinessError)
+        self.assertEqual(result.skipped, ["user::god"])
+
+    def test_run_async_sleeps_when_in_flight_limit_is_reached(self):
+        """Test that the status is not polled in a busy loop while statements wait for a free slot."""
+        backend = FakeBackend()
+        started = {}
+        is_done = MagicMock(side_effect=lambda query_id: time.monotonic() - started[query_id] >= 0.1)
+
+        def submit(sql):
+            query_id = FakeBackend.submit(backend, sql)
+            started[query_id] = time.monotonic()
+            return query_id
+
+        backend.submit = submit
+        backend.is_done = is_done
+
+        result = Executor(d_map={"role::a": [], "role::b": [], "role::c": []}).run_async(
+            backend=backend,
+            statements={"role::a": "SQL a", "role::b": "SQL b", "role::c": "SQL c"},
+            max_in_flight=2,
+            poll_interval=0.02,
+        )
+
+        self.assertTrue(result.ok)
+        # Two rounds of about 0.1 seconds, polled every 0.02 seconds.
+        self.assertLess(is_done.call_count, 50)
+
+    def test_local_backend(self):
+        """Test that the local backend executes on submit and reports errors when polled."""
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as conn:
+            backend = LocalBackend(conn)
+
+            valid_id = backend.submit("CREATE TABLE actors (id INTEGER PRIMARY KEY)")
+            invalid_id = backend.submit("CREATE TABLE actors (id INTEGER PRIMARY KEY)")
+
+            self.assertTrue(backend.is_done(valid_id))
+            with self.assertRaises(Exception):  # noqa: B017
+                backend.is_done(invalid_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+"""Unit test module."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported where they are first used, never when the pipeline modules load.
+HEAVY_MODULES = ("sqlalchemy", "cryptography", "sqlparse", "jinja2", "rich")
+
+
+class TestImports(unittest.TestCase):
+    """Unit tests for the import cost of the pipeline modules."""
+
+    def imported_heavy_modules(self, code: str) -> list[str]:
+        """Run the code in a fresh interpreter and return the heavy modules it imported."""
+        check = (
+            f"{code}\n"
+            "import sys\n"
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", check],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return [m for m in result.stdout.strip().split(",") if m]
+
+    def test_pipeline_modules_import_no_heavy_module(self):
+        """Test that importing the pipeline modules does not import the heavy dependencies."""
+        self.assertEqual(
+            self.imported_heavy_modules(
+                "import main, utils, drift, plan, executor, errors, tracing, metrics, state_cache, connection, output",
+            ),
+            [],
+        )
+
+    def test_loading_definitions_imports_no_heavy_module(self):
+        """Test that the definitions are mapped and sorted without the heavy dependencies."""
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "role.toml"), "w", encoding="utf-8") as f:
+                f.write('[[role]]\nname = "viewer"\ndepends_on = {}\n')
+            with open(os.path.join(tmp, "database.toml"), "w", encoding="utf-8") as f:
+                f.write('[[database]]\nname = "analytics"\ndepends_on = {role = ["viewer"]}\n')
+
+            code = (
+                "from utils import Utils\n"
+                f"utils = Utils(resources_path='resources.toml', definitions_path={tmp!r})\n"
+                "assert utils.dependencies_sort(utils.dependencies_map())[-1] == 'database::analytics'\n"
+            )
+            self.assertEqual(self.imported_heavy_modules(code), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+"""Unit test module."""
+
+import io
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine
+
+from errors import ExecutionError, SQLExecutionError
+from main import InputConfig, apply_plan, run
+from output import Output
+from plan import Plan, PlanItem
+from utils import Utils
+
+
+class TestApplyPlan(unittest.TestCase):
+    """Unit tests for the apply_plan function."""
+
+    def setUp(self):
+        """Set up a plan with a table and a grant the select grant was merged into."""
+        self.utils = Utils(
+            resources_path="resources.toml",
+            definitions_path="definitions",
+        )
+        self.utils.output = Output(mode="compact", stream=io.StringIO())
+        items = [
+            PlanItem(
+                node="table::films",
+                resource_type="table",
+                name="films",
+                iac_action="create",
+                sql="CREATE TABLE films (id INTEGER)",
+            ),
+            PlanItem(
+                node="grant::insert",
+                resource_type="grant",
+                name="insert",
+                iac_action="create",
+                sql="GRANT SELECT, INSERT ON TABLE films TO ROLE viewer",
+                depends_on=["table::films"],
+                merged=["grant::select"],
+            ),
+        ]
+        self.plan = Plan(run_mode="create-or-update", items={item.node: item for item in items})
+        self.config = InputConfig(
+            workspace="",
+            database_system="sqlite",
+            definitions_path="definitions",
+            resources_path="resources.toml",
+            dry_run=False,
+            run_mode="create-or-update",
+        )
+
+    def test_serial_failure_names_every_merged_resource(self):
+        """Test that a failed consolidated grant is reported for each grant merged into it."""
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as conn, self.assertRaises(ExecutionError) as ctx:
+            apply_plan(plan=self.plan, conn=conn, utils=self.utils, config=self.config)
+
+        self.assertEqual(sorted(ctx.exception.failed), ["grant::insert", "grant::select"])
+        self.assertIsInstance(ctx.exception.failed["grant::select"], SQLExecutionError)
+
+    def test_async_run_reports_executed_statements(self):
+        """Test that the statements completed in async mode are reported as executed."""
+        items = [
+            PlanItem(node=f"table::t{i}", resource_type="table", name=f"t{i}", iac_action="create", sql=f"CREATE TABLE t{i} (id INTEGER)")
+            for i in range(2)
+        ]
+        plan = Plan(run_mode="create-or-update", items={item.node: item for item in items})
+        config = InputConfig(**{**vars(self.config), "execution_mode": "async"})
+
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as conn:
+            apply_plan(plan=plan, conn=conn, utils=self.utils, config=config)
+
+        self.assertEqual(self.utils.output.executed_statements, 2)
+
+    def test_batch_failure_names_the_failed_resource(self):
+        """Test that a failed batch statement is reported for its resource and the rest of the batch skipped."""
+        items = [
+            PlanItem(node=f"role::r{i}", resource_type="role", name=f"r{i}", iac_action="create", sql=f"CREATE ROLE r{i}")
+            for i in range(3)
+        ]
+        plan = Plan(run_mode="create-or-update", items={item.node: item for item in items})
+        config = InputConfig(**{**vars(self.config), "batch_size": 3})
+
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as conn, self.assertRaises(ExecutionError) as ctx:
+            apply_plan(
+                plan=plan,
+                conn=conn,
+                utils=self.utils,
+                config=config,
+                # The second statement of the batch fails.
+                batch_template="SELECT '2 Role already exists'",
+            )
+
+        self.assertEqual(list(ctx.exception.failed), ["role::r1"])
+        self.assertIn("Role already exists", str(ctx.exception.failed["role::r1"].original_error))
+        self.assertEqual(ctx.exception.skipped, ["role::r2"])
+        # The summary holds the database error, not the message of the SQL error.
+        self.assertIn("- role::r1: Role already exists", str(ctx.exception))
+
+
+
+class TestRun(unittest.TestCase):
+    """Unit tests for the run function."""
+
+    def test_run_creates_resource_with_wait_time(self):
+        """Test that a resource with a wait time is found ready right after it is created."""
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "defs"))
+            with open(os.path.join(tmp, "defs", "table.toml"), "w", encoding="utf-8") as f:
+                f.write(
+                    '[[table]]\nname = "actors"\ndatabase = "main"\nschema = "main"\nowner = "sqlite"\n'
+                    "depends_on = {}\nwait_time = 3\n"
+                    '[[table.columns]]\nname = "id"\ntype = "INTEGER"\nnullable = true\ndefault = ""\n',
+                )
+            database_path = os.path.join(tmp, "run.db")
+            resources_path = os.path.join(tmp, "resources.toml")
+            with open("resources.toml", encoding="utf-8") as f:
+                resources = f.read().replace("sqlite:///foo.db", f"sqlite:///{database_path}")
+            with open(resources_path, "w", encoding="utf-8") as f:
+                f.write(resources)
+
+            run(InputConfig(
+                workspace=tmp,
+                database_system="sqlite",
+                definitions_path="/defs",
+                resources_path=resources_path,
+                dry_run=False,
+                run_mode="create-or-update",
+            ))
+
+            with create_engine(f"sqlite:///{database_path}").connect() as conn:
+                tables = [row[0].lower() for row in conn.exec_driver_sql("SELECT name FROM sqlite_master")]
+
+        self.assertEqual(tables, ["actors"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Unit test module."""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+
+from metrics import Metrics, MeteredConnection, statement_kind
+
+
+class TestMetrics(unittest.TestCase):
+    """Unit tests for the Metrics class and the metered connection."""
+
+    def test_statement_kind(self):
+        """Test that reads are state queries and everything else is DDL."""
+        self.assertEqual(statement_kind("  select 1"), "state")
+        self.assertEqual(statement_kind("SHOW GRANTS TO ROLE viewer"), "state")
+        self.assertEqual(statement_kind("CREATE TABLE actors (id INTEGER)"), "ddl")
+
+    def test_metered_connection_records_queries(self):
+        """Test that queries are counted by kind and resource type with their rows, and results stay readable."""
+        metrics = Metrics()
+        engine = create_engine("sqlite:///:memory:")
+        with engine.connect() as raw_conn:
+            conn = MeteredConnection(raw_conn, metrics)
+
+            with metrics.labels("table"):
+                conn.exec_driver_sql("CREATE TABLE actors (id INTEGER)")
+                conn.exec_driver_sql("INSERT INTO actors VALUES (1), (2), (3)")
+                rows = conn.exec_driver_sql("SELECT id FROM actors").scalars().all()
+                with self.assertRaises(Exception):  # noqa: B017
+                    conn.exec_driver_sql("SELECT missing FROM actors")
+            conn.exec_driver_sql("SELECT 1").first()
+
+        self.assertEqual(rows, [1, 2, 3])
+        self.assertEqual(metrics.series[("ddl", "table")][:3], [2, 0, 0])
+        self.assertEqual(metrics.series[("state", "table")][:3], [2, 1, 3])
+        self.assertEqual(metrics.series[("state", "none")][:3], [1, 0, 1])
+
+        text = metrics.prometheus()
+        self.assertIn('sqliac_queries_total{kind="state",resource_type="table"} 2', text)
+        self.assertIn('sqliac_query_duration_seconds_bucket{kind="ddl",resource_type="table",le="+Inf"} 2', text)
+        self.assertIn("| state | table | 2 | 1 | 3 |", metrics.markdown())
+
+    def test_write_textfile_and_step_summary(self):
+        """Test that the textfile is written and the summary is appended to the GitHub job summary."""
+        metrics = Metrics()
+        metrics.observe("SELECT 1", 0.02, rows=1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            summary = os.path.join(tmp, "summary.md")
+            with patch.dict("os.environ", {"GITHUB_STEP_SUMMARY": summary}):
+                metrics.write(os.path.join(tmp, "metrics", "sqliac.prom"))
+
+            with open(os.path.join(tmp, "metrics", "sqliac.prom"), encoding="utf-8") as f:
+                self.assertIn("sqliac_query_rows_total", f.read())
+            with open(summary, encoding="utf-8") as f:
+                self.assertIn("### Database queries", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
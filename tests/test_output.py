@@ -0,0 +1,97 @@
+"""Unit test module."""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from output import Output
+from plan import PlanItem
+
+
+class TestOutput(unittest.TestCase):
+    """Unit tests for the Output class."""
+
+    def setUp(self):
+        """Set up planned changes of every action."""
+        self.items = [
+            PlanItem(node="role::viewer", resource_type="role", name="viewer", iac_action="create", sql="CREATE ROLE viewer"),
+            PlanItem(node="table::films", resource_type="table", name="films", iac_action="alter", sql="ALTER TABLE films"),
+            PlanItem(
+                node="grant::insert",
+                resource_type="grant",
+                name="insert",
+                iac_action="create",
+                sql="GRANT SELECT, INSERT ON TABLE films TO ROLE viewer",
+                merged=["grant::select"],
+            ),
+        ]
+
+    def test_compact_mode_prints_one_line_per_action(self):
+        """Test that the compact mode prints a line per planned action and the counts."""
+        stream = io.StringIO()
+        output = Output(mode="compact", stream=stream)
+
+        for item in self.items:
+            output.plan_item(item)
+        output.executed(node="role::viewer")
+        output.executed(statements=2)
+        output.summary()
+        output.close()
+
+        self.assertEqual(
+            stream.getvalue().splitlines(),
+            [
+                "+ role::viewer",
+                "~ table::films",
+                "+ grant::insert (+1 merged)",
+                "Plan: 2 to create, 1 to alter, 0 to drop. 3 statement(s) executed.",
+            ],
+        )
+
+    def test_ndjson_mode_writes_events(self):
+        """Test that the ndjson mode writes the plan, executed statements and counts as JSON lines."""
+        stream = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "out", "run.ndjson")
+            output = Output(mode="ndjson", path=path, stream=stream)
+
+            output.plan_item(self.items[0])
+            output.executed(node="role::viewer")
+            output.summary()
+            output.close()
+
+            with open(path, encoding="utf-8") as f:
+                events = [json.loads(line) for line in f]
+
+        self.assertEqual([event["event"] for event in events], ["plan", "executed", "summary"])
+        self.assertEqual(events[0]["sql"], "CREATE ROLE viewer")
+        self.assertEqual(events[2], {"event": "summary", "create": 1, "alter": 0, "drop": 0, "executed": 1})
+        self.assertEqual(stream.getvalue(), "")
+
+    @patch("output.BUFFER_SECONDS", 60)
+    def test_console_output_is_buffered(self):
+        """Test that the messages are written out together on flush, not one by one."""
+        stream = io.StringIO()
+        output = Output(stream=stream)
+
+        output.print("Plan saved")
+        output.executed(node="role::viewer")
+        self.assertEqual(stream.getvalue(), "")
+
+        output.flush()
+        self.assertIn("Plan saved", stream.getvalue())
+        self.assertIn("SQL EXECUTION SUCCESSFULL", stream.getvalue())
+
+    def test_invalid_output_mode(self):
+        """Test that an unknown mode, or the ndjson mode without a path, is refused."""
+        with self.assertRaises(ValueError):
+            Output(mode="verbose")
+        with self.assertRaises(ValueError):
+            Output(mode="ndjson")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,422 @@
+"""Unit test module."""
+
+import json
+import os
+import tempfile
+import tomllib
+import unittest
+from unittest.mock import patch, MagicMock
+
+from sqlalchemy import create_engine
+
+from drift import Drift
+from errors import AlterError, PlanError, PlanningError, TemplateFileError
+from executor import split_statements
+from plan import Plan, PlanItem, Planner
+from state_cache import StateCache
+from utils import Utils
+
+
+class TestPlanner(unittest.TestCase):
+    """Unit tests for the Planner class."""
+
+    def setUp(self):
+        """Set up a planner over two roles and a database depending on one of them."""
+        self.utils = Utils(
+            resources_path="resources.toml",
+            definitions_path="definitions",
+        )
+        self.utils.definitions_index = {
+            "role::bi_admin_role": {"name": "bi_admin_role", "depends_on": {}},
+            "role::viewer": {"name": "viewer", "depends_on": {}},
+            "database::analytics": {
+                "name": "analytics",
+                "wait_time": 5,
+                "depends_on": {"role": ["bi_admin_role"]},
+            },
+        }
+        self.d_map = {
+            "role::bi_admin_role": [],
+            "role::viewer": [],
+            "database::analytics": ["role::bi_admin_role"],
+        }
+        self.sorted_map = ["role::viewer", "role::bi_admin_role", "database::analytics"]
+
+        resource_config = {
+            "state_query": "SELECT '{{ name }}'",
+            "template": """
+            {% if iac_action.upper() == 'CREATE' %}CREATE {{ name }}
+            {% elif iac_action.upper() == 'ALTER' %}ALTER {{ name }}
+            {% elif iac_action.upper() == 'DROP' %}DROP {{ name }}{% endif %}
+            """,
+            "iac_action": {"create": "CREATE", "alter": "ALTER", "drop": "DROP"},
+        }
+        self.db_sys_resources = {
+            "role": resource_config,
+            "database": resource_config,
+        }
+
+        # The drift of each resource, as returned by Drift.resource_state
+        self.states = {
+            "bi_admin_role": {"iac_action": "create", "definition": {"name": "bi_admin_role"}},
+            "viewer": {"iac_action": "no-action", "definition": None},
+            "analytics": {"iac_action": "alter", "definition": {"name": "analytics"}},
+        }
+
+    def resource_state(self, definition, state_query, name, resource_type=None, covered=None):  # noqa: ARG002
+        """Fake Drift.resource_state, looking up the state by name."""
+        return self.states[name]
+
+    def test_build_plan(self):
+        """Test that the plan holds the action and SQL of every resource in dependency order."""
+        planner = Planner(
+            utils=self.utils,
+            db_sys_resources=self.db_sys_resources,
+            run_mode="create-or-update",
+        )
+
+        with patch("drift.Drift.resource_state", side_effect=self.resource_state):
+            plan = planner.build(
+                sorted_map=self.sorted_map,
+                d_map=self.d_map,
+                drift=Drift(conn=MagicMock()),
+            )
+
+        self.assertEqual(list(plan.items), self.sorted_map)
+        self.assertEqual(
+            [(item.node, item.iac_action, item.sql) for item in plan.changes()],
+            [
+                ("role::bi_admin_role", "create", "CREATE bi_admin_role"),
+                ("database::analytics", "alter", "ALTER analytics"),
+            ],
+        )
+        self.assertEqual(plan.items["database::analytics"].wait_time, 5)
+        self.assertEqual(plan.d_map(), self.d_map)
+
+    def test_build_plan_concurrently(self):
+        """Test that the state queries run on a worker pool, with one connection per worker.
+
+        Only the resources that exist are dropped in destroy mode.
+        """
+        connections = []
+
+        def connection_factory():
+            conn = MagicMock()
+            connections.append(conn)
+            return conn
+
+        planner = Planner(
+            utils=self.utils,
+            db_sys_resources=self.db_sys_resources,
+            run_mode="destroy",
+        )
+
+        with patch("drift.Drift.resource_state", side_effect=self.resource_state):
+            plan = planner.build(
+                sorted_map=self.sorted_map,
+                d_map=self.d_map,
+                drift=Drift(conn=MagicMock()),
+                max_workers=3,
+                connection_factory=connection_factory,
+            )
+
+        self.assertEqual(list(plan.items), self.sorted_map)
+        self.assertEqual(
+            [item.iac_action for item in plan.items.values()],
+            ["drop", "no-action", "drop"],
+        )
+        self.assertTrue(1 <= len(connections) <= 3)
+        for conn in connections:
+            conn.close.assert_called_once()
+
+    def test_build_plan_concurrently_reports_planning_failures(self):
+        """Test that a single planning failure is raised as is, and several as a planning error."""
+        def resource_state(definition, state_query, name, resource_type=None, covered=None):
+            if name in failing:
+                raise TemplateFileError(name=name, file="resources.toml", error=Exception("unexpected end of template"))
+            return self.resource_state(definition, state_query, name, resource_type, covered)
+
+        planner = Planner(
+            utils=self.utils,
+            db_sys_resources=self.db_sys_resources,
+            run_mode="create-or-update",
+        )
+
+        with patch("drift.Drift.resource_state", side_effect=resource_state):
+            failing = {"analytics"}
+            with self.assertRaises(TemplateFileError):
+                planner.build(
+                    sorted_map=self.sorted_map,
+                    d_map=self.d_map,
+                    drift=Drift(conn=MagicMock()),
+                    max_workers=3,
+                    connection_factory=MagicMock,
+                )
+
+            failing = {"analytics", "viewer"}
+            with self.assertRaises(PlanningError) as ctx:
+                planner.build(
+                    sorted_map=self.sorted_map,
+                    d_map=self.d_map,
+                    drift=Drift(conn=MagicMock()),
+                    max_workers=3,
+                    connection_factory=MagicMock,
+                )
+
+        self.assertEqual(sorted(ctx.exception.failed), ["database::analytics", "role::viewer"])
+        self.assertIn("2 resource(s) failed to be planned", str(ctx.exception))
+
+    def test_build_plan_skips_fresh_resources(self):
+        """Test that resources fresh in the state cache skip the drift check."""
+        drift = Drift(conn=MagicMock())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            state_cache = StateCache(path=os.path.join(tmp, "state.json"))
+            state_cache.record(
+                "role::bi_admin_role",
+                drift.definition_fingerprint(self.utils.definitions_index["role::bi_admin_role"]),
+            )
+            # The definition changed since this fingerprint was recorded.
+            state_cache.record("database::analytics", "outdated")
+
+            planner = Planner(
+                utils=self.utils,
+                db_sys_resources=self.db_sys_resources,
+                run_mode="create-or-update",
+                state_cache=state_cache,
+            )
+
+            with patch("drift.Drift.resource_state", side_effect=self.resource_state) as mock_state:
+                plan = planner.build(
+                    sorted_map=self.sorted_map,
+                    d_map=self.d_map,
+                    drift=drift,
+                )
+
+        checked = [c.kwargs["name"] for c in mock_state.call_args_list]
+        self.assertEqual(checked, ["viewer", "analytics"])
+        self.assertTrue(plan.items["role::bi_admin_role"].cached)
+        self.assertEqual(plan.items["role::bi_admin_role"].iac_action, "no-action")
+        self.assertEqual(plan.items["database::analytics"].iac_action, "alter")
+        self.assertIsNotNone(plan.items["database::analytics"].fingerprint)
+
+    def test_plan_resource_with_missing_template(self):
+        """Test that a resource type without a config raises TemplateFileError."""
+        planner = Planner(
+            utils=self.utils,
+            db_sys_resources={},
+            run_mode="create-or-update",
+        )
+
+        with self.assertRaises(TemplateFileError):
+            planner.plan_resource("role::viewer", Drift(conn=MagicMock()))
+
+    def test_plan_alter_adds_and_drops_columns(self):
+        """Test that a column change renders the alter statements of the table, which then match the definition."""
+        with open("resources.toml", "rb") as f:
+            db_sys_resources = tomllib.load(f)["sqlite"]["resources"]
+        self.utils.definitions_index = {
+            "table::actors": {
+                "name": "actors",
+                "database": "main",
+                "schema": "main",
+                "owner": "sqlite",
+                "depends_on": {},
+                "columns": [
+                    {"name": "id", "type": "INTEGER", "nullable": True, "default": ""},
+                    {"name": "title", "type": "TEXT", "nullable": True, "default": ""},
+                ],
+            },
+        }
+        planner = Planner(
+            utils=self.utils,
+            db_sys_resources=db_sys_resources,
+            run_mode="create-or-update",
+        )
+
+        with create_engine("sqlite://").connect() as conn:
+            conn.exec_driver_sql("CREATE TABLE actors (id INTEGER, age INTEGER)")
+            plan = planner.build(
+                sorted_map=["table::actors"],
+                d_map={"table::actors": []},
+                drift=Drift(conn=conn),
+            )
+            item = plan.items["table::actors"]
+            self.assertEqual(item.iac_action, "alter")
+            self.assertEqual(len(split_statements(item.sql)), 2)
+
+            self.utils.execute_rendered_sql_template(conn=conn, sql=item.sql)
+            columns = [row[1].lower() for row in conn.exec_driver_sql("PRAGMA table_info(actors)")]
+
+        self.assertEqual(columns, ["id", "title"])
+
+    def test_plan_alter_of_changed_column_is_reported(self):
+        """Test that a column type change SQLite cannot alter fails the plan instead of being dropped."""
+        with open("resources.toml", "rb") as f:
+            db_sys_resources = tomllib.load(f)["sqlite"]["resources"]
+        self.utils.definitions_index = {
+            "table::actors": {
+                "name": "actors",
+                "database": "main",
+                "schema": "main",
+                "owner": "sqlite",
+                "depends_on": {},
+                "columns": [{"name": "id", "type": "TEXT", "nullable": True, "default": ""}],
+            },
+        }
+        planner = Planner(
+            utils=self.utils,
+            db_sys_resources=db_sys_resources,
+            run_mode="create-or-update",
+        )
+
+        with create_engine("sqlite://").connect() as conn:
+            conn.exec_driver_sql("CREATE TABLE actors (id INTEGER)")
+            with self.assertRaises(AlterError) as ctx:
+                planner.build(
+                    sorted_map=["table::actors"],
+                    d_map={"table::actors": []},
+                    drift=Drift(conn=conn),
+                )
+
+        self.assertIn("SQLite cannot alter the columns ID", str(ctx.exception))
+
+    def test_plan_file_round_trip(self):
+        """Test that a written plan is loaded back with the same actions, SQL and dependencies."""
+        planner = Planner(
+            utils=self.utils,
+            db_sys_resources=self.db_sys_resources,
+            run_mode="create-or-update",
+        )
+        with patch("drift.Drift.resource_state", side_effect=self.resource_state):
+            plan = planner.build(
+                sorted_map=self.sorted_map,
+                d_map=self.d_map,
+                drift=Drift(conn=MagicMock()),
+            )
+        plan.account_fingerprint = "account"
+        plan.definitions_fingerprint = "definitions"
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "plan.json")
+            plan.write(path)
+            loaded = Plan.load(path)
+
+        self.assertEqual(loaded.items, plan.items)
+        self.assertEqual(loaded.d_map(), self.d_map)
+        self.assertEqual(loaded.run_mode, "create-or-update")
+        self.assertIsNotNone(loaded.created_at)
+
+        # The plan is fresh only for the same account and definitions.
+        loaded.check_fresh(path=path, account_fingerprint="account", definitions_fingerprint="definitions")
+        with self.assertRaises(PlanError):
+            loaded.check_fresh(path=path, account_fingerprint="other", definitions_fingerprint="definitions")
+        with self.assertRaises(PlanError):
+            loaded.check_fresh(path=path, account_fingerprint="account", definitions_fingerprint="changed")
+
+    def test_plan_batches_group_independent_statements(self):
+        """Test that batches only hold resources without dependencies between them, in dependency order."""
+        def item(node, depends_on=(), sql="GRANT", wait_time=None):
+            return PlanItem(
+                node=node,
+                resource_type=node.split("::")[0],
+                name=node.split("::")[1],
+                iac_action="create",
+                sql=sql,
+                wait_time=wait_time,
+                depends_on=list(depends_on),
+            )
+
+        items = [
+            item("role::a"),
+            item("role::b"),
+            item("warehouse::wh", wait_time=60),
+            item("database::db", ["role::a"], sql=None),
+            item("grant::a1", ["role::a"]),
+            item("grant::a2", ["role::a"]),
+            item("grant::db", ["database::db"]),
+            item("grant::b", ["role::b"]),
+        ]
+        plan = Plan(run_mode="create-or-update", items={i.node: i for i in items})
+
+        batches = [[i.node for i in batch] for batch in plan.batches(batch_size=2)]
+
+        self.assertEqual(
+            batches,
+            [
+                ["warehouse::wh"],
+                ["role::a", "role::b"],
+                ["grant::a1", "grant::a2"],
+                ["grant::b"],
+                ["grant::db"],
+            ],
+        )
+        self.assertEqual(len(plan.batches(batch_size=1)), len(plan.changes()))
+
+    def test_consolidate_grants(self):
+        """Test that grants differing only in privilege are merged, and grants others depend on are not."""
+        grants = {
+            "grant::select": {"privilege": "select", "depends_on": {"table": ["orders"]}},
+            "grant::insert": {"privilege": "insert", "depends_on": {"role": ["bi_admin_role"]}},
+            "grant::update": {"privilege": "update", "depends_on": {}},
+            "grant::other_role": {"privilege": "select", "to_role": "viewer", "depends_on": {}},
+        }
+        self.utils.definitions_index = {
+            node: {
+                "name": node.split("::")[1],
+                "on_object_type": "table",
+                "on_object": "orders",
+                "to_role": "bi_admin_role",
+                "with_grant_option": False,
+                **definition,
+            }
+            for node, definition in grants.items()
+        }
+        self.db_sys_resources = {
+            "grant": {
+                "template": "GRANT {{ privilege }} ON {{ on_object_type }} {{ on_object }} TO ROLE {{ to_role }}",
+                "iac_action": {"create": "GRANT", "drop": "REVOKE"},
+            },
+        }
+        items = [
+            PlanItem(node=node, resource_type="grant", name=node.split("::")[1], iac_action="create", sql="GRANT")
+            for node in grants
+        ]
+        items[0].depends_on = ["table::orders"]
+        items[1].depends_on = ["role::bi_admin_role"]
+        # A resource depends on the update grant, it stays on its own.
+        items.append(
+            PlanItem(node="view::v", resource_type="view", name="v", iac_action="create", depends_on=["grant::update"]),
+        )
+        plan = Plan(run_mode="create-or-update", items={i.node: i for i in items})
+
+        planner = Planner(
+            utils=self.utils,
+            db_sys_resources=self.db_sys_resources,
+            run_mode="create-or-update",
+        )
+        plan = planner.consolidate_grants(plan)
+
+        merged = plan.items["grant::insert"]
+        self.assertEqual(" ".join(merged.sql.split()), "GRANT SELECT, INSERT ON table orders TO ROLE bi_admin_role")
+        self.assertEqual(merged.merged, ["grant::select"])
+        self.assertEqual(merged.depends_on, ["role::bi_admin_role", "table::orders"])
+        self.assertEqual(plan.resources("grant::insert"), ["grant::insert", "grant::select"])
+        self.assertIsNone(plan.items["grant::select"].sql)
+        self.assertEqual(plan.items["grant::update"].sql, "GRANT")
+        self.assertEqual(plan.items["grant::other_role"].sql, "GRANT")
+
+    def test_plan_file_of_another_version(self):
+        """Test that a plan file of another format version is refused."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "plan.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"version": 0, "run_mode": "create-or-update", "items": []}, f)
+
+            with self.assertRaises(PlanError):
+                Plan.load(path)
+
+
+
+if __name__ == "__main__":
+    unittest.main()
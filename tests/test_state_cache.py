@@ -0,0 +1,63 @@
+"""Unit test module."""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from state_cache import StateCache
+
+
+class TestStateCache(unittest.TestCase):
+    """Unit tests for the StateCache class."""
+
+    def setUp(self):
+        """Set up a temporary state cache file path."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache", "state.json")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.tmp.cleanup()
+
+    def test_missing_file_starts_empty(self):
+        """Test that a missing or unreadable cache file is an empty cache."""
+        self.assertEqual(StateCache(path=self.path).resources, {})
+
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("not json")
+        self.assertEqual(StateCache(path=self.path).resources, {})
+
+    def test_record_save_and_load(self):
+        """Test that recorded fingerprints are fresh after the cache is saved and loaded again."""
+        cache = StateCache(path=self.path)
+        cache.record("role::viewer", "abc")
+        cache.record("role::admin", "def")
+        cache.forget("role::admin")
+        cache.save()
+
+        loaded = StateCache(path=self.path)
+
+        self.assertTrue(loaded.is_fresh("role::viewer", "abc"))
+        self.assertFalse(loaded.is_fresh("role::viewer", "changed"))
+        self.assertFalse(loaded.is_fresh("role::admin", "def"))
+
+    def test_ttl_and_refresh(self):
+        """Test that an entry older than the ttl, or a forced refresh, is not fresh."""
+        cache = StateCache(path=self.path, ttl=60)
+        with patch("state_cache.time.time", return_value=1000):
+            cache.record("role::viewer", "abc")
+
+        with patch("state_cache.time.time", return_value=1059):
+            self.assertTrue(cache.is_fresh("role::viewer", "abc"))
+        with patch("state_cache.time.time", return_value=1061):
+            self.assertFalse(cache.is_fresh("role::viewer", "abc"))
+
+        cache.refresh = True
+        with patch("state_cache.time.time", return_value=1000):
+            self.assertFalse(cache.is_fresh("role::viewer", "abc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
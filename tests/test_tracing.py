@@ -0,0 +1,53 @@
+"""Unit test module."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from tracing import Tracer
+
+
+class TestTracer(unittest.TestCase):
+    """Unit tests for the Tracer class."""
+
+    def test_disabled_tracer_records_nothing(self):
+        """Test that a disabled tracer returns the same empty context and records no span."""
+        tracer = Tracer()
+
+        with tracer.span("plan"), tracer.span("role::viewer", "render", node="role::viewer"):
+            pass
+
+        self.assertIs(tracer.span("plan"), tracer.span("apply"))
+        self.assertEqual(tracer.events, [])
+
+    def test_trace_file_and_totals(self):
+        """Test that spans are written as Chrome trace events and aggregated by phase, step and resource."""
+        tracer = Tracer(enabled=True)
+
+        with tracer.span("plan"):
+            for node in ["role::viewer", "database::analytics"]:
+                with tracer.span(node, "drift", node=node):
+                    pass
+                with tracer.span(node, "render", node=node):
+                    pass
+        with tracer.span("apply"), tracer.span("role::viewer", "execute", node="role::viewer"):
+            pass
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace", "run.json")
+            tracer.write(path)
+            with open(path, encoding="utf-8") as f:
+                trace = json.load(f)
+
+        self.assertEqual(len(trace["traceEvents"]), 7)
+        self.assertTrue(all(event["ph"] == "X" and event["dur"] >= 0 for event in trace["traceEvents"]))
+
+        phases, steps, resources = tracer.totals()
+        self.assertEqual(sorted(phases), ["apply", "plan"])
+        self.assertEqual({category: count for category, (count, _) in steps.items()}, {"drift": 2, "render": 2, "execute": 1})
+        self.assertEqual(sorted(resources["role::viewer"]), ["drift", "execute", "render"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,16 @@
 """Unit test module."""
 
+import os
+import subprocess
+import tempfile
+import tomllib
 import unittest
 from unittest.mock import patch
 from sqlalchemy.engine import Connection
 
-from utils import Utils
-from errors import DefinitionKeyError, DependencyError, TemplateFileError, SQLExecutionError
+from executor import split_statements
+from utils import Utils, TemplateCache, pretty_sql
+from errors import DefinitionKeyError, DefinitionLoadError, DependencyError, TemplateFileError, SQLExecutionError, ReadinessError, SelectorError
 
 class TestUtils(unittest.TestCase):  
     """Unit tests for the Utils class and its dependency-related methods."""
@@ -39,6 +44,27 @@ class TestUtils(unittest.TestCase):
         result = self.loader.dependencies_map()
         self.assertEqual(result, expected)
 
+    @patch("tomllib.load")
+    def test_dependencies_map_indexes_definitions(self, mock_tomli_load):
+        """Test dependencies_map indexes every definition by its "type::name" key."""
+        definition = {
+            "name": "ajwa_presentation",
+            "comment": "presentation layer",
+            "depends_on": {
+                "role": ["bi_admin_role"],
+            },
+        }
+        mock_tomli_load.return_value = {
+            "database": [definition],
+        }
+
+        self.loader.dependencies_map()
+
+        self.assertEqual(
+            self.loader.definitions_index,
+            {"database::ajwa_presentation": definition},
+        )
+
     @patch("tomllib.load")
     def test_dependencies_map_with_no_dependencies(self, mock_tomli_load):
         """Test dependencies_map returns empty list when depends_on is not defined."""
@@ -75,6 +101,50 @@ class TestUtils(unittest.TestCase):
 
         self.assertIn("depends_on", str(context.exception))
 
+    def test_dependencies_map_with_workers_matches_serial_load(self):
+        """Test that the definition files parsed on a process pool give the same map and index, in the same order."""
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(4):
+                with open(os.path.join(tmp, f"role_{i}.toml"), "w", encoding="utf-8") as f:
+                    f.write(
+                        f'[[role]]\nname = "r{i}"\ndepends_on = {{role = ["r{i - 1}"]}}\n' if i
+                        else '[[role]]\nname = "r0"\ndepends_on = {}\n',
+                    )
+            loader = Utils(resources_path="resources.toml", definitions_path=tmp)
+
+            serial = loader.dependencies_map()
+            serial_index = loader.definitions_index
+            parallel = loader.dependencies_map(workers=2)
+
+        self.assertEqual(list(parallel.items()), list(serial.items()))
+        self.assertEqual(list(loader.definitions_index.items()), list(serial_index.items()))
+        self.assertEqual(parallel["role::r3"], ["role::r2"])
+
+    def test_dependencies_map_with_workers_reports_every_file(self):
+        """Test that the errors of all the definition files are raised together."""
+        with tempfile.TemporaryDirectory() as tmp:
+            files = {
+                "a.toml": '[[role]]\nname = "viewer"\ndepends_on = {}\n',
+                "b.toml": "[[role]\nname = ",
+                "c.toml": '[[role]]\nname = "admin"\n',
+            }
+            for file, content in files.items():
+                with open(os.path.join(tmp, file), "w", encoding="utf-8") as f:
+                    f.write(content)
+            loader = Utils(resources_path="resources.toml", definitions_path=tmp)
+
+            with self.assertRaises(DefinitionLoadError) as context:
+                loader.dependencies_map(workers=2)
+
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in context.exception.errors),
+            ["b.toml", "c.toml"],
+        )
+        self.assertIn("depends_on", str(context.exception))
+        # The parse error is reported with its position in the file.
+        self.assertIn("TOMLDecodeError", context.exception.errors[os.path.join(tmp, "b.toml")])
+        self.assertIn("line 1", context.exception.errors[os.path.join(tmp, "b.toml")])
+
     def test_dependencies_sort_with_valid_dependencies_map(self):
         """Tests the dependencies_sort method to ensure it returns a correctly sorted list of objects based on their dependencies.
 
@@ -130,6 +200,142 @@ class TestUtils(unittest.TestCase):
         with self.assertRaises(DependencyError):
             self.loader.dependencies_sort(d_map)
 
+    def test_dependencies_sort_reports_dangling_dependencies(self):
+        """Test that every dependency on an undefined resource is reported with the resource declaring it."""
+        d_map = {
+            "role::bi_god_role": ["wrong::god"],
+            "role::bi_admin_role": [],
+            "database::ajwa_presentation": ["role::bi_admin_role", "role::missing"],
+        }
+
+        with self.assertRaises(DependencyError) as context:
+            self.loader.dependencies_sort(d_map)
+
+        self.assertEqual(
+            context.exception.dangling,
+            [("role::bi_god_role", "wrong::god"), ("database::ajwa_presentation", "role::missing")],
+        )
+        self.assertIn("'database::ajwa_presentation' depends on 'role::missing'", str(context.exception))
+        self.assertNotIn("role::bi_admin_role", str(context.exception))
+
+    def test_dependencies_sort_reports_only_the_cycle(self):
+        """Test that a cycle is reported alone, without the resources around it."""
+        d_map = {
+            "database::analytics": ["role::a"],
+            "role::a": ["role::b"],
+            "role::b": ["role::c"],
+            "role::c": ["role::a", "user::god"],
+            "user::god": [],
+            "role::viewer": [],
+        }
+
+        with self.assertRaises(DependencyError) as context:
+            self.loader.dependencies_sort(d_map)
+
+        self.assertEqual(context.exception.cycle, ["role::a", "role::b", "role::c", "role::a"])
+        self.assertIn("role::a -> role::b -> role::c -> role::a", str(context.exception))
+        self.assertNotIn("database::analytics", str(context.exception))
+
+    def test_dependencies_sort_of_a_large_chain(self):
+        """Test that a deep graph is sorted without recursion, dependencies first."""
+        size = 100_000
+        d_map = {f"table::t{i}": [f"table::t{i - 1}"] if i else [] for i in range(size)}
+
+        result = self.loader.dependencies_sort(d_map)
+
+        self.assertEqual(result[0], "table::t0")
+        self.assertEqual(result[-1], f"table::t{size - 1}")
+
+    def test_downstream_subgraph_keeps_dependents_in_order(self):
+        """Test that a changed resource selects its dependents and the order among them is kept."""
+        d_map = {
+            "role::bi_admin_role": [],
+            "database::analytics": ["role::bi_admin_role"],
+            "schema::reporting": ["database::analytics"],
+            "warehouse::bi_wh": [],
+        }
+
+        selected = self.loader.downstream(d_map, {"database::analytics"})
+        subgraph = self.loader.subgraph(d_map, selected)
+
+        self.assertEqual(
+            subgraph,
+            {
+                "database::analytics": [],
+                "schema::reporting": ["database::analytics"],
+            },
+        )
+        self.assertEqual(
+            self.loader.dependencies_sort(subgraph),
+            ["database::analytics", "schema::reporting"],
+        )
+
+    def test_select_nodes_with_ancestors_and_descendants(self):
+        """Test that selectors add the ancestors or descendants of a resource and reject unknown resources."""
+        d_map = {
+            "role::bi_admin": [],
+            "database::analytics": ["role::bi_admin"],
+            "table::orders": ["database::analytics"],
+            "grant::orders_select": ["table::orders", "role::bi_admin"],
+            "warehouse::bi_wh": [],
+        }
+
+        self.assertEqual(self.loader.select_nodes(d_map, "table::orders"), {"table::orders"})
+        self.assertEqual(
+            self.loader.select_nodes(d_map, "+table::orders"),
+            {"role::bi_admin", "database::analytics", "table::orders"},
+        )
+        self.assertEqual(
+            self.loader.select_nodes(d_map, "database::analytics+, warehouse::bi_wh"),
+            {"database::analytics", "table::orders", "grant::orders_select", "warehouse::bi_wh"},
+        )
+
+        selected = self.loader.select_nodes(d_map, "+grant::orders_select")
+        self.assertEqual(
+            self.loader.dependencies_sort(self.loader.subgraph(d_map, selected)),
+            ["role::bi_admin", "database::analytics", "table::orders", "grant::orders_select"],
+        )
+
+        with self.assertRaises(SelectorError):
+            self.loader.select_nodes(d_map, "table::missing+")
+
+    def test_changed_definitions_against_git_ref(self):
+        """Test that definitions are compared with a git ref into changed and removed resources."""
+        with tempfile.TemporaryDirectory() as repo:
+            definitions_path = os.path.join(repo, "definitions")
+            os.makedirs(definitions_path)
+
+            def git(*args):
+                subprocess.run(
+                    ["git", "-C", repo, "-c", "user.name=test", "-c", "user.email=test@test", *args],
+                    check=True,
+                    capture_output=True,
+                )
+
+            def write(content):
+                with open(os.path.join(definitions_path, "roles.toml"), "w", encoding="utf-8") as f:
+                    f.write(content)
+
+            git("init", "-q")
+            write(
+                '[[role]]\nname = "viewer"\ncomment = "old"\ndepends_on = {}\n'
+                '[[role]]\nname = "editor"\ncomment = ""\ndepends_on = {}\n'
+                '[[role]]\nname = "legacy"\ncomment = ""\ndepends_on = {}\n',
+            )
+            git("add", "-A")
+            git("commit", "-q", "-m", "base")
+            write(
+                '[[role]]\nname = "viewer"\ncomment = "new"\ndepends_on = {}\n'
+                '[[role]]\nname = "editor"\ncomment = ""\ndepends_on = {}\n'
+                '[[role]]\nname = "admin"\ncomment = ""\ndepends_on = {}\n',
+            )
+
+            loader = Utils(resources_path="resources.toml", definitions_path=definitions_path)
+            loader.dependencies_map()
+            changed, removed = loader.changed_definitions("HEAD")
+
+        self.assertEqual(changed, {"role::viewer", "role::admin"})
+        self.assertEqual(removed, {"role::legacy"})
 
     def test_render_templates_with_valid_temmplate(self):
         """Test that render_templates correctly renders a template with the given definition and action."""
@@ -165,6 +371,48 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(result, expected)
 
 
+    def test_render_snowflake_column_alter_templates(self):
+        """Test that the Snowflake table templates render one ALTER per column change."""
+        columns = {
+            "added": [{"name": "rating", "type": "NUMBER", "nullable": False, "default": 0, "comment": None}],
+            "removed": [{"name": "legacy"}],
+            "changed": [{
+                "name": "title",
+                "type": "VARCHAR(200)",
+                "nullable": True,
+                "default": None,
+                "comment": "Film title",
+                "changed": ["type", "nullable", "default", "comment"],
+            }],
+        }
+        alter = dict.fromkeys(
+            ["cluster_by", "comment", "object_id_tag", "old_name", "new_name", "suspended", "warehouse", "target_lag",
+             "refresh_mode", "initialize", "data_retention_time_in_days", "max_data_extension_time_in_days", "as_",
+             "change_tracking", "default_ddl_collation"],
+        )
+        alter.update({"name": "films", "columns": columns})
+
+        def render(file):
+            with open(os.path.join("resources", file), encoding="utf-8") as f:
+                template = f.read()
+            sql = self.loader.render_templates(template=template, definition=alter, iac_action="ALTER", name="films")
+            return [line.strip() for line in sql.splitlines()]
+
+        self.assertEqual(
+            render("table.sql"),
+            [
+                "ALTER TABLE films ADD COLUMN rating NUMBER NOT NULL DEFAULT 0;",
+                "ALTER TABLE films DROP COLUMN legacy;",
+                "ALTER TABLE films ALTER COLUMN title SET DATA TYPE VARCHAR(200);",
+                "ALTER TABLE films ALTER COLUMN title DROP NOT NULL;",
+                "ALTER TABLE films ALTER COLUMN title DROP DEFAULT;",
+                "ALTER TABLE films ALTER COLUMN title COMMENT 'Film title'",
+            ],
+        )
+        # The columns of dynamic and event tables are derived, only their comments are altered.
+        for file in ("dynamic_table.sql", "event_table.sql"):
+            self.assertEqual(render(file), ["COMMENT ON COLUMN films.title IS 'Film title'"])
+
     def test_render_templates_with_invalid_temmplate(self):
         """Test that render_templates raises TemplateFileError for an invalid template fron config."""
         template = """
@@ -224,7 +472,7 @@ class TestUtils(unittest.TestCase):
         }
 
         # This scrip will fail. The success is in removing the special charachters.
-        expected = "CREATE ROLE bi_god_role\nDROP ALL haha"
+        expected = "CREATE ROLE bi_god_role drop all  haha"
 
         result = self.loader.render_templates(
             template=template,
@@ -234,6 +482,30 @@ class TestUtils(unittest.TestCase):
         )
         self.assertEqual(result, expected)
 
+    def test_pretty_sql_formats_each_statement_once(self):
+        """Test that the executed SQL is left as rendered and only reindented to be shown, once per statement."""
+        template = """
+        {% if iac_action.upper() == 'CREATE' %}
+
+        create table {{ name }} (id integer, title text);
+
+        {% endif %}
+        """
+        sql = self.loader.render_templates(
+            template=template,
+            definition={"name": "films"},
+            iac_action="create",
+            name="films",
+        )
+        self.assertEqual(sql, "create table films (id integer, title text)")
+
+        pretty_sql.cache_clear()
+        for _ in range(3):
+            pretty = pretty_sql(sql)
+        self.assertEqual(pretty, "CREATE TABLE films (id integer, title text)")
+        self.assertEqual(pretty_sql.cache_info().misses, 1)
+        self.assertEqual(pretty_sql.cache_info().hits, 2)
+
     def test_render_templates_with_invalid_definition(self):
         """Test that render_templates raises TemplateFileError for an invalid definiton of the resource."""
         template = """
@@ -265,6 +537,40 @@ class TestUtils(unittest.TestCase):
                 name=obj_name,
             )
 
+    def test_render_templates_reuses_compiled_templates(self):
+        """Test that render_templates compiles a template once and serves later renders from the cache."""
+        self.loader.template_cache = TemplateCache(maxsize=2)
+        template = "CREATE ROLE {{ name }}"
+
+        for role in ["bi_god_role", "bi_admin_role", "viewer"]:
+            result = self.loader.render_templates(
+                template=template,
+                definition={"name": role},
+                iac_action="create",
+                name=role,
+            )
+            self.assertEqual(result, f"CREATE ROLE {role}")
+
+        info = self.loader.template_cache.info()
+        self.assertEqual(info["misses"], 1)
+        self.assertEqual(info["hits"], 2)
+
+    def test_template_cache_is_bounded(self):
+        """Test that the least recently used template is evicted once the cache is full."""
+        cache = TemplateCache(maxsize=2)
+        cache.get("DROP ROLE {{ name }}")
+        cache.get("CREATE ROLE {{ name }}")
+        cache.get("DROP ROLE {{ name }}")
+        cache.get("CREATE USER {{ name }}")
+
+        self.assertEqual(cache.info()["size"], 2)
+
+        # The recently used template is still cached, the evicted one is compiled again.
+        cache.get("DROP ROLE {{ name }}")
+        cache.get("CREATE ROLE {{ name }}")
+        self.assertEqual(cache.info()["hits"], 2)
+        self.assertEqual(cache.info()["misses"], 4)
+
     @patch("tomllib.load")
     @patch.dict("os.environ", {
     "SQLITE_ENGINE_SQLALCHEMY_CONNECT_ARGS_TIMEOUT": "1",
@@ -327,6 +633,88 @@ class TestUtils(unittest.TestCase):
             )
 
 
+    def test_execute_rendered_sql_template_with_several_statements(self):
+        """Test that rendered SQL with several statements runs them one at a time."""
+        conn:Connection = self.test_create_db_sys_connection_with_valid_config()
+        sql = """
+            CREATE TABLE directors (id INTEGER);
+            ALTER TABLE directors ADD COLUMN name TEXT;
+
+            ALTER TABLE directors ADD COLUMN 'born;died' TEXT;
+        """
+
+        self.assertEqual(len(split_statements(sql)), 3)
+        self.loader.execute_rendered_sql_template(conn=conn, sql=sql)
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(directors)")]
+        self.assertEqual(columns, ["id", "name", "born;died"])
+
+    def test_execute_batch_maps_failure_to_statement(self):
+        """Test that a batch reports the index of the failed statement and its error."""
+        conn:Connection = self.test_create_db_sys_connection_with_valid_config()
+        statements = ["GRANT a", "GRANT b", "GRANT c"]
+
+        # The batch templates return the outcome of the block, faked with a select.
+        self.assertIsNone(
+            self.loader.execute_batch(conn=conn, template="SELECT 0", statements=statements),
+        )
+        self.assertEqual(
+            self.loader.execute_batch(
+                conn=conn,
+                template="SELECT '{{ statements | length - 1 }} Object does not exist'",
+                statements=statements,
+            ),
+            (1, "Object does not exist"),
+        )
+        with self.assertRaises(SQLExecutionError):
+            self.loader.execute_batch(conn=conn, template="SELECT 'unexpected'", statements=statements)
+
+    def test_render_snowflake_batch_template(self):
+        """Test that the Snowflake batch template numbers every statement of the block."""
+        with open("resources.toml", "rb") as f:
+            template = tomllib.load(f)["snowflake"]["batch"]["template"]
+        statements = ["GRANT USAGE ON DATABASE analytics TO ROLE viewer;", "CREATE ROLE loader\n"]
+
+        sql = self.loader.template_cache.get(template)[0].render(statements=statements)
+        lines = [line.strip() for line in sql.strip().splitlines() if line.strip()]
+
+        self.assertEqual(lines[0], "EXECUTE IMMEDIATE $$")
+        self.assertEqual(
+            lines[lines.index("BEGIN") + 1:lines.index("RETURN 0;")],
+            [
+                "step := 1;",
+                "GRANT USAGE ON DATABASE analytics TO ROLE viewer;",
+                "step := 2;",
+                "CREATE ROLE loader;",
+            ],
+        )
+        self.assertIn("RETURN step || ' ' || SQLERRM;", lines)
+        self.assertEqual(lines[-1], "$$")
+
+    @patch("utils.time.sleep")
+    def test_execute_rendered_sql_template_polls_readiness(self, mock_sleep):
+        """Test that a resource with a wait time is polled until ready instead of sleeping the whole time."""
+        conn:Connection = self.test_create_db_sys_connection_with_valid_config()
+        ready_query = "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'actors'"
+
+        self.loader.execute_rendered_sql_template(
+            conn=conn,
+            sql="CREATE TABLE actors (id INTEGER PRIMARY KEY)",
+            wait_time=60,
+            ready_query=ready_query,
+        )
+
+        # The table is ready right away, there is no wait.
+        mock_sleep.assert_not_called()
+
+        with self.assertRaises(ReadinessError):
+            self.loader.wait_until_ready(
+                conn=conn,
+                ready_query="SELECT NULL",
+                timeout=0.05,
+                interval=0.01,
+            )
+        self.assertGreater(mock_sleep.call_count, 0)
+
         
 
 
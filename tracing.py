@@ -0,0 +1,157 @@
+"""Tracing of the pipeline run.
+
+This module provides:
+- Tracer: records spans of the phases and resources of a run, written as a Chrome trace;
+- TRACER: the tracer shared by the pipeline modules, disabled until `enable` is called.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# Returned by a disabled tracer, entering it costs nothing.
+_NO_SPAN = nullcontext()
+
+
+class Tracer:
+    """Record the time spent in every phase of the run and every step of each resource.
+
+    A span has a name, a category, e.g. "phase", "render", "drift" or
+    "execute", and optional arguments such as the resource key. When the
+    tracer is disabled, `span` returns a shared empty context and nothing is
+    recorded.
+    """
+
+    def __init__(self, *, enabled: bool = False):
+        """Initialize the tracer, disabled by default."""
+        self.enabled = enabled
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def enable(self) -> None:
+        """Start recording spans, the trace starts now."""
+        self.enabled = True
+        self._start = time.perf_counter()
+
+    def clear(self) -> None:
+        """Drop the recorded spans."""
+        with self._lock:
+            self.events.clear()
+
+    def span(self, name: str, category: str = "phase", **args: object):
+        """Context measuring the time of a span, or an empty context when disabled.
+
+        Args:
+            name (str): The name of the span, e.g. the phase or the resource key.
+            category (str): The kind of span, used to aggregate the summary.
+            **args: Details of the span, written in the trace.
+
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return self._record(name, category, args)
+
+    @contextmanager
+    def _record(self, name: str, category: str, args: dict) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self._start) * 1e6, 3),
+                "dur": round((end - start) * 1e6, 3),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = {k: str(v) for k, v in args.items()}
+            with self._lock:
+                self.events.append(event)
+
+    def write(self, path: str) -> None:
+        """Write the spans in the Chrome trace event format, opened with chrome://tracing or Perfetto."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock, open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f, separators=(",", ":"))
+
+    def totals(self) -> tuple[dict[str, float], dict[str, list[float]], dict[str, dict[str, float]]]:
+        """Seconds spent in every phase, in every kind of step, and in the steps of each resource.
+
+        Returns:
+            tuple: The seconds of the phases, the count and seconds of the steps
+                by category, and the seconds of the resources by category.
+
+        """
+        phases: dict[str, float] = {}
+        steps: dict[str, list[float]] = {}
+        resources: dict[str, dict[str, float]] = {}
+        with self._lock:
+            for event in self.events:
+                seconds = event["dur"] / 1e6
+                if event["cat"] == "phase":
+                    phases[event["name"]] = phases.get(event["name"], 0) + seconds
+                    continue
+
+                count, total = steps.get(event["cat"], [0, 0])
+                steps[event["cat"]] = [count + 1, total + seconds]
+                if "node" in event.get("args", {}):
+                    node_steps = resources.setdefault(event["args"]["node"], {})
+                    node_steps[event["cat"]] = node_steps.get(event["cat"], 0) + seconds
+        return phases, steps, resources
+
+    def summary(self, top: int = 10) -> None:
+        """Print the time of the phases, of the kinds of steps and of the slowest resources."""
+        from rich.table import Table  # noqa: PLC0415
+
+        from output import OUTPUT  # noqa: PLC0415
+
+        phases, steps, resources = self.totals()
+
+        table = Table(title="Phases")
+        table.add_column("Phase")
+        table.add_column("Seconds", justify="right")
+        for name, seconds in sorted(phases.items(), key=lambda p: p[1], reverse=True):
+            table.add_row(name, f"{seconds:.3f}")
+        OUTPUT.print(table)
+
+        table = Table(title="Steps")
+        table.add_column("Step")
+        table.add_column("Count", justify="right")
+        table.add_column("Seconds", justify="right")
+        for category, (count, seconds) in sorted(steps.items(), key=lambda s: s[1][1], reverse=True):
+            table.add_row(category, str(count), f"{seconds:.3f}")
+        OUTPUT.print(table)
+
+        categories = sorted({category for node_steps in resources.values() for category in node_steps})
+        table = Table(title=f"Slowest {top} resources")
+        table.add_column("Resource")
+        for category in categories:
+            table.add_column(category, justify="right")
+        table.add_column("Total", justify="right")
+        slowest = sorted(resources.items(), key=lambda r: sum(r[1].values()), reverse=True)[:top]
+        for node, node_steps in slowest:
+            table.add_row(
+                node,
+                *(f"{node_steps.get(category, 0):.3f}" for category in categories),
+                f"{sum(node_steps.values()):.3f}",
+            )
+        OUTPUT.print(table)
+
+
+TRACER = Tracer()
@@ -1,27 +1,215 @@
 """Utility functions.
 
 This module provides utility function for the pipeline run.
+
+SQLAlchemy, cryptography, sqlparse, Jinja2 and rich are imported where
+they are first used, loading the definitions does not pay for them.
 """
 
+from __future__ import annotations
+
 import tomllib
 import os
 import re
-import sqlparse
-from sqlalchemy import create_engine, Connection
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
-from collections import deque
-from jinja2 import Environment, meta, UndefinedError, TemplateSyntaxError
-from rich.console import Console
+import hashlib
+import json
+import subprocess
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING
 import time
 
 from errors import (
+    AlterError,
     DefinitionKeyError,
+    DefinitionLoadError,
     DependencyError,
     FileError,
+    GitError,
+    ReadinessError,
+    SelectorError,
     TemplateFileError,
     SQLExecutionError,
 )
+from executor import READY_POLL_INTERVAL, READY_MAX_INTERVAL, split_statements
+from output import OUTPUT
+from tracing import TRACER
+
+if TYPE_CHECKING:
+    from jinja2 import Environment, Template
+    from sqlalchemy import Connection
+
+
+def load_definition_file(file_path: str) -> list[tuple[str, list[str], dict]]:
+    """Parse a definition file into the key, dependencies and definition of its resources.
+
+    Args:
+        file_path (str): Path of the definition file.
+
+    Returns:
+        list: A ("resource_type::name", dependencies keys, definition) tuple per resource.
+
+    """
+    try:
+        with open(file_path,"rb") as f:
+            definition = tomllib.load(f)
+    except Exception as err:
+        raise FileError(path=file_path, resource_type=os.path.basename(file_path)) from err
+
+    entries = []
+    if definition:
+        # Get the resource name from the definition dictionary
+        # The resource name is the key of the dictionary.
+        resource = "".join(definition.keys())
+
+        # For each item in the definition create
+        # a combination of the resource and it's name.
+        # Example: "database::ajwa_presentation"
+
+        for i in definition[resource]:
+            o_hash = f"{resource}::{i['name']}"
+
+            # Check if the resource definition has `depend_on` field
+            # Raise exception if as it's mandatory even if None
+            dependencies:dict = i.get("depends_on","missing")
+
+            if dependencies == "missing":
+                raise DefinitionKeyError(
+                    keys=["depends_on"],
+                    name=resource,
+                    file=resource,
+                )
+
+            # For each dependency, the dependency resource
+            # and it's corresponding name is combined.
+            # Example: "role::bi_admin_role"
+            d_hash = [
+                f"{key}::{i}"
+                for key, value in dependencies.items()
+                for i in value
+            ]
+            entries.append((o_hash, d_hash, i))
+
+    return entries
+
+
+def _load_definition_file_reported(file_path: str) -> tuple[list, str | None]:
+    """Process pool worker, parse a definition file and return its error message instead of raising it.
+
+    The errors of the pipeline are not rebuilt from their message, only the message is sent back,
+    with the parse error it was raised from, which holds the line and column of the mistake.
+    """
+    try:
+        return load_definition_file(file_path), None
+    except Exception as err:  # noqa: BLE001
+        if err.__cause__ is not None:
+            return [], f"{err} ({type(err.__cause__).__name__}: {err.__cause__})"
+        return [], str(err)
+
+
+# Lines holding only whitespace left by the template tags, with the line break before them.
+BLANK_LINES = re.compile(r"\n\s*\n")
+
+
+def canonical_sql(sql: str) -> str:
+    """Rendered SQL without blank lines, surrounding whitespaces and trailing semicolon."""
+    return BLANK_LINES.sub("\n", sql).strip().strip(";").strip()
+
+
+@lru_cache(maxsize=1024)
+def pretty_sql(sql: str) -> str:
+    """Reindented SQL with upper case keywords, to show a statement.
+
+    Formatting is slow, it is only done for the statements shown and each
+    distinct statement is formatted once.
+    """
+    import sqlparse  # noqa: PLC0415
+
+    with TRACER.span("sqlparse.format", "format"):
+        return sqlparse.format(sql, reindent=True, keyword_case="upper")
+
+
+def unsupported_change(name: str, changes: str) -> None:
+    """Template function, fails the rendering of a change the database cannot alter."""
+    raise AlterError(name=name, changes=changes)
+
+
+class TemplateCache:
+    """Bounded cache of compiled Jinja templates keyed by the template text.
+
+    Each entry holds the compiled template and the set of variables it requires,
+    so a template is parsed once per run no matter how many resources use it.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        """Create the shared Jinja environment and an empty cache.
+
+        Args:
+            maxsize (int): Maximum number of compiled templates kept, least recently used are evicted.
+
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._templates: OrderedDict[str, tuple[Template, frozenset[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @cached_property
+    def env(self) -> Environment:
+        """The Jinja environment, created on the first template."""
+        from jinja2 import Environment  # noqa: PLC0415
+        env = Environment()
+        env.globals["unsupported_change"] = unsupported_change
+        return env
+
+    def get(self, template: str) -> tuple[Template, frozenset[str]]:
+        """Return the compiled template and its undeclared variables, compiling it on a miss."""
+        with self._lock:
+            cached = self._templates.get(template)
+            if cached is not None:
+                self._templates.move_to_end(template)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        from jinja2 import meta  # noqa: PLC0415
+
+        # Parse once, the same AST is used for the variables lookup and the compilation.
+        parsed = self.env.parse(template)
+        compiled = (
+            self.env.from_string(parsed),
+            frozenset(meta.find_undeclared_variables(parsed)),
+        )
+
+        with self._lock:
+            self._templates[template] = compiled
+            self._templates.move_to_end(template)
+            while len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+
+        return compiled
+
+    def info(self) -> dict:
+        """Hit and miss counters of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._templates),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self) -> None:
+        """Drop all compiled templates and reset the counters."""
+        with self._lock:
+            self._templates.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared by every Utils instance, a run only uses a handful of distinct templates.
+TEMPLATE_CACHE = TemplateCache()
 
 
 class Utils:
@@ -38,13 +226,17 @@ class Utils:
             resources_path (str): Path to the folder containing resource templates
                                   (SQL files with Jinja formatting).
             definitions_path (str): Path to the folder containing resource definitions
-            console (rich.console.Console): Console instance used for user-facing output.
+            output (Output): Output of the messages and executed statements, the shared one.
 
         """
         try:
             self.resources_path = resources_path
             self.definitions_path = definitions_path
-            self.console = Console()
+            self.template_cache = TEMPLATE_CACHE
+            self.output = OUTPUT
+            # Definitions of every resource keyed by "resource_type::name",
+            # filled by `dependencies_map` so each file is parsed only once.
+            self.definitions_index: dict[str, dict] = {}
         except Exception as err:
             raise FileError(definitions_path, resources_path) from err
 
@@ -56,7 +248,7 @@ class Utils:
             return string.lower() == "true"
         if string is None or string in {"None",""}:
             return None
-        return None
+        return string
 
     def render_templates(
         self,
@@ -77,26 +269,21 @@ class Utils:
             str: The rendered SQL template as a string.
 
         """
+        from jinja2 import TemplateSyntaxError, UndefinedError  # noqa: PLC0415
+
         try:
-            env = Environment()
+            rsc_template, required_vars = self.template_cache.get(template)
             if not definition:
-                rsc_template = env.from_string(template)
                 sql = rsc_template.render(
                     name=name,
                 )
-                return sqlparse.format(
-                    re.sub(r"\n+", "\n", sql).strip().strip(";"),
-                    reindent=True,
-                    keyword_case="upper",
-                )
+                return canonical_sql(sql)
 
             # Validate that all keys in the template are present in definition
-            parsed_rsc_template = env.parse(template)
-            required_vars = meta.find_undeclared_variables(parsed_rsc_template)
             missing_vars = [
                 var
                 for var in required_vars
-                if var not in definition and var != "iac_action"
+                if var not in definition and var != "iac_action" and var not in self.template_cache.env.globals
             ]
             if missing_vars:
                 raise TemplateFileError(
@@ -113,118 +300,321 @@ class Utils:
                 for k, v in definition.items()
             }
 
-            rsc_template = env.from_string(template)
             sql = rsc_template.render(
                 iac_action=iac_action,
                 **sanitized_definition,
             )
-            # Clean excrea new lines.
-            sql_clean = re.sub(r"\n+", "\n", sql)
-            # Remove leading/trailing whitespaces and semicolon.
-            sql_clean = sql_clean.strip()
-            sql_clean = sql_clean.strip(";")
 
         except (KeyError, TemplateSyntaxError, UndefinedError) as e:
             raise TemplateFileError(name, self.resources_path, e) from e
 
-        return sqlparse.format(sql_clean, reindent=True, keyword_case="upper")
+        # Executed as rendered, it is only reindented to be shown, see `pretty_sql`.
+        return canonical_sql(sql)
 
-    def dependencies_map(self) -> dict:
-        """Create a topographic depencies map of the resource."""
-        # List all files with resource definitions
-        definitions_files = os.listdir(self.definitions_path)
+    def dependencies_map(self, workers: int = 1) -> dict:
+        """Create a topographic depencies map of the resource.
 
-        d_map = {}
-        for file in definitions_files:
+        The parsed definition of every resource is also stored in
+        `self.definitions_index` under the same "resource_type::name" key.
 
-            file_path = os.path.join(self.definitions_path, file)
-            try:
-                with open(file_path,"rb") as f:
-                    definition = tomllib.load(f)
-            except Exception as err:
-                raise FileError(path=file_path, resource_type=file) from err
-
-            if definition:
-                # Get the resource name from the definition dictionary
-                # The resource name is the key of the dictionary.
-                resource = "".join(definition.keys())
-
-                # For each item in the definition create
-                # a combination of the resource and it's name.
-                # Example: "database::ajwa_presentation"
-
-                for i in definition[resource]:
-                    o_hash = f"{resource}::{i['name']}"
-
-                    # Check if the resource definition has `depend_on` field
-                    # Raise exception if as it's mandatory even if None
-                    dependencies:dict = i.get("depends_on","missing")
-
-                    if dependencies == "missing":
-                        raise DefinitionKeyError(
-                            keys=["depends_on"],
-                            name=resource,
-                            file=resource,
-                        )
-
-                    # Check if the resource has any dependencies
-                    if dependencies != "missing":
-                        # For each dependency, the dependency resource
-                        # and it's corresponding name is combined.
-                        # Example: "role::bi_admin_role"
-                        d_hash = [
-                            f"{key}::{i}"
-                            for key, value in dependencies.items()
-                            for i in value
-                        ]
-                    else:
-                        # If the resource has no dependecies,
-                        # an empty list is assigned.
-                        d_hash = []
-                    d_map[o_hash] = d_hash
+        Args:
+            workers (int): Number of processes parsing the definition files. With
+                several workers every file is parsed, and the errors of all the
+                files are raised together in a DefinitionLoadError.
+
+        """
+        # List all files with resource definitions, in a stable order.
+        definitions_files = sorted(os.listdir(self.definitions_path))
+        files_paths = [os.path.join(self.definitions_path, file) for file in definitions_files]
+
+        if workers > 1 and len(files_paths) > 1:
+            loaded = self._load_definitions_files(files_paths, workers)
+        else:
+            loaded = [load_definition_file(file_path) for file_path in files_paths]
+
+        d_map = {}
+        self.definitions_index = {}
+        # Merge in the file order, the same as a serial load.
+        for entries in loaded:
+            for o_hash, d_hash, definition in entries:
+                d_map[o_hash] = d_hash
+                self.definitions_index[o_hash] = definition
 
         return d_map
 
+    def _load_definitions_files(self, files_paths: list[str], workers: int) -> list[list]:
+        """Parse the definition files on a process pool, in the order of the files.
+
+        Raises:
+            DefinitionLoadError: When one or more files cannot be parsed.
+
+        """
+        chunksize = max(1, len(files_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=min(workers, len(files_paths))) as pool:
+            results = list(pool.map(_load_definition_file_reported, files_paths, chunksize=chunksize))
+
+        errors = {
+            file_path: error
+            for file_path, (_, error) in zip(files_paths, results, strict=True)
+            if error is not None
+        }
+        if errors:
+            raise DefinitionLoadError(errors=errors)
+        return [entries for entries, _ in results]
+
+    def downstream(self, d_map: dict, nodes: set[str]) -> set[str]:
+        """Return the nodes together with every resource depending on them, directly or transitively."""
+        dependents: dict[str, list[str]] = {}
+        for node, dependencies in d_map.items():
+            for dependency in dependencies:
+                dependents.setdefault(dependency, []).append(node)
+
+        selected = set()
+        stack = [node for node in nodes if node in d_map]
+        while stack:
+            current = stack.pop()
+            if current in selected:
+                continue
+            selected.add(current)
+            stack.extend(dependents.get(current, []))
+        return selected
+
+    def upstream(self, d_map: dict, nodes: set[str]) -> set[str]:
+        """Return the nodes together with every resource they depend on, directly or transitively."""
+        selected = set()
+        stack = [node for node in nodes if node in d_map]
+        while stack:
+            current = stack.pop()
+            if current in selected:
+                continue
+            selected.add(current)
+            stack.extend(dependency for dependency in d_map[current] if dependency in d_map)
+        return selected
+
+    def select_nodes(self, d_map: dict, selectors: str) -> set[str]:
+        """Select resources of the dependency map with graph selectors.
+
+        A selector is a resource key, "resource_type::name". A "+" before the key
+        adds the resources it depends on, a "+" after it adds the resources
+        depending on it, e.g. "+table::orders", "role::bi_admin+" or "+grant::x+".
+
+        Args:
+            d_map (dict): The dependency map.
+            selectors (str): Selectors separated by commas or spaces, the selections are combined.
+
+        Returns:
+            set: The selected resources keys.
+
+        """
+        selected = set()
+        for selector in re.split(r"[,\s]+", selectors.strip()):
+            if not selector:
+                continue
+
+            node = selector.strip("+")
+            if "::" not in node:
+                raise SelectorError(selector, "expected 'resource_type::name'")
+            if node not in d_map:
+                raise SelectorError(selector, f"'{node}' is not in the definitions")
+
+            selected.add(node)
+            if selector.startswith("+"):
+                selected |= self.upstream(d_map, {node})
+            if selector.endswith("+"):
+                selected |= self.downstream(d_map, {node})
+
+        return selected
+
+    def subgraph(self, d_map: dict, nodes: set[str]) -> dict:
+        """Keep only the selected nodes of the map and the dependencies between them."""
+        return {
+            node: [dependency for dependency in dependencies if dependency in nodes]
+            for node, dependencies in d_map.items()
+            if node in nodes
+        }
+
+    def _git(self, *args: str) -> str:
+        """Run a git command in the definitions folder and return its output."""
+        command = ["git", "-C", self.definitions_path, *args]
+        try:
+            return subprocess.run(command, capture_output=True, text=True, check=True).stdout  # noqa: S603
+        except (OSError, subprocess.CalledProcessError) as err:
+            raise GitError(command, getattr(err, "stderr", None) or str(err)) from err
+
+    def changed_definitions(self, base_ref: str) -> tuple[set[str], set[str]]:
+        """Compare the definitions with the definitions at a git ref.
+
+        Must be called after `dependencies_map`, which indexes the current definitions.
+
+        Args:
+            base_ref (str): The git ref to compare with, e.g. "origin/main".
+
+        Returns:
+            tuple: The "resource_type::name" keys added or changed since the ref, and the removed ones.
+
+        """
+        # Files of the definitions folder at the ref, with their path from the repository root.
+        base_index = {}
+        files = self._git("ls-tree", "--full-name", "--name-only", base_ref, "./").splitlines()
+        for file in files:
+            if not file.endswith(".toml"):
+                continue
+            try:
+                definition = tomllib.loads(self._git("show", f"{base_ref}:{file}"))
+            except tomllib.TOMLDecodeError:
+                # An unreadable definition at the ref, all its resources count as changed.
+                continue
+            for resource, items in definition.items():
+                for i in items:
+                    base_index[f"{resource}::{i.get('name')}"] = i
+
+        changed = {
+            node
+            for node, definition in self.definitions_index.items()
+            if base_index.get(node) != definition
+        }
+        removed = set(base_index) - set(self.definitions_index)
+        return changed, removed
+
     def dependencies_sort(self, d_map: dict) -> list:
-        """Sorts the order in which the resources templates need to execute."""
+        """Sorts the order in which the resources templates need to execute.
+
+        The resources are interned into integer IDs in the order they first
+        appear in the map, the graph is sorted on lists indexed by ID.
+
+        Raises:
+            DependencyError: With every dependency on an undefined resource and
+                the resource declaring it, or with one cycle of the map.
+
+        """
+        # Dependencies on undefined resources, with the resource declaring them.
+        dangling = [
+            (node, neighbor)
+            for node, neighbors in d_map.items()
+            for neighbor in neighbors
+            if neighbor not in d_map
+        ]
+        if dangling:
+            raise DependencyError(dangling=dangling)
+
+        # Intern the resources, a resource gets its ID the first time it appears.
+        ids: dict[str, int] = {}
+        for node, neighbors in d_map.items():
+            ids.setdefault(node, len(ids))
+            for neighbor in neighbors:
+                ids.setdefault(neighbor, len(ids))
+        nodes = list(ids)
+        adjacency = [[ids[neighbor] for neighbor in d_map[node]] for node in nodes]
+
         # Calculate in-degrees of all nodes
-        try:
-            # Calculate in-degrees of all nodes, ensuring neighbors are initialized
-            in_degree = {}
-            for node, neighbors in d_map.items():
-                # Ensure the node exists in the in_degree map
-                in_degree.setdefault(node, 0)
-                for neighbor in neighbors:
-                    in_degree[neighbor] = in_degree.get(neighbor, 0) + 1
-
-            # Add nodes with in-degree 0 to the queue
-            queue = deque([node for node in in_degree if in_degree[node] == 0])
-
-            # Process nodes in the queue
-            topo_order = []
-            processed_count = 0  # To track processed nodes
-            while queue:
-                current = queue.popleft()
-                topo_order.append(current)
-                processed_count += 1
-
-                # Reduce the in-degree of neighbors
-                for neighbor in d_map[current]:
-                    in_degree[neighbor] -= 1
-                    if in_degree[neighbor] == 0:  # Add to queue if in-degree becomes 0
-                        queue.append(neighbor)
-
-        except KeyError as err:
-            raise DependencyError(d_map) from err
+        in_degree = [0] * len(nodes)
+        for neighbors in adjacency:
+            for neighbor in neighbors:
+                in_degree[neighbor] += 1
+
+        # Add nodes with in-degree 0 to the queue
+        queue = deque(i for i, degree in enumerate(in_degree) if degree == 0)
+
+        # Process nodes in the queue
+        topo_order = []
+        while queue:
+            current = queue.popleft()
+            topo_order.append(current)
+
+            # Reduce the in-degree of neighbors
+            for neighbor in adjacency[current]:
+                in_degree[neighbor] -= 1
+                if in_degree[neighbor] == 0:  # Add to queue if in-degree becomes 0
+                    queue.append(neighbor)
 
         # Check if all nodes were processed
-        if processed_count != len(d_map):
-            raise DependencyError(d_map, is_cyclical=True)
+        if len(topo_order) != len(nodes):
+            remaining = [i for i, degree in enumerate(in_degree) if degree > 0]
+            cycle = self._find_cycle(adjacency, remaining)
+            raise DependencyError(cycle=[nodes[i] for i in cycle])
 
-        return topo_order[::-1]
+        return [nodes[i] for i in reversed(topo_order)]
 
-    def create_db_sys_connection(self, database_system: str):
-        """Create SQL connection for query execution."""
+    def _find_cycle(self, adjacency: list[list[int]], remaining: list[int]) -> list[int]:
+        """Return one cycle among the resources left unsorted, as IDs with the first one repeated at the end.
+
+        The shortest cycle through the first resource of the first strongly
+        connected component with a cycle is returned.
+        """
+        return self._shortest_cycle(adjacency, self._cyclic_component(adjacency, remaining))
+
+    def _cyclic_component(self, adjacency: list[list[int]], remaining: list[int]) -> set[int]:
+        """Return the first strongly connected component of the unsorted resources holding a cycle.
+
+        The components are found with Tarjan's algorithm, without recursion.
+        """
+        candidates = set(remaining)
+        index: dict[int, int] = {}
+        low: dict[int, int] = {}
+        stack: list[int] = []
+        on_stack: set[int] = set()
+
+        def visit(node: int) -> tuple[int, list[int], int]:
+            # Each frame is a node, its unsorted neighbors and the position of the next one to visit.
+            index[node] = low[node] = len(index)
+            stack.append(node)
+            on_stack.add(node)
+            return (node, [n for n in adjacency[node] if n in candidates], 0)
+
+        for root in remaining:
+            if root in index:
+                continue
+            frames = [visit(root)]
+            while frames:
+                node, neighbors, position = frames[-1]
+                if position < len(neighbors):
+                    frames[-1] = (node, neighbors, position + 1)
+                    neighbor = neighbors[position]
+                    if neighbor not in index:
+                        frames.append(visit(neighbor))
+                    elif neighbor in on_stack:
+                        low[node] = min(low[node], index[neighbor])
+                    continue
+
+                frames.pop()
+                if frames:
+                    parent = frames[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    # The node is the root of a component, its members are on the stack above it.
+                    members = set()
+                    while node not in members:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        members.add(member)
+                    if len(members) > 1 or node in adjacency[node]:
+                        return members
+        return set()
+
+    def _shortest_cycle(self, adjacency: list[list[int]], component: set[int]) -> list[int]:
+        """Shortest path from the first resource of the component back to itself."""
+        start = min(component)
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for neighbor in adjacency[node]:
+                if neighbor == start:
+                    cycle = [start]
+                    while node is not None:
+                        cycle.append(node)
+                        node = previous[node]
+                    return cycle[::-1]
+                if neighbor in component and neighbor not in previous:
+                    previous[neighbor] = node
+                    queue.append(neighbor)
+        return [start, start]
+
+    def engine_config(self, database_system: str) -> tuple[str, dict]:
+        """Load the engine URL and connect arguments of the database system.
+
+        Connect arguments are overridden by the matching environment variables.
+        """
         # Load the engine connection arguments of the database system.
         try:
             with open(self.resources_path, "rb") as f:
@@ -254,16 +644,44 @@ class Utils:
         except KeyError as e:
             raise ValueError(f"Missing keys in databse system config: {e}") from e  # noqa: TRY003
 
+        return url, connect_args
+
+    def account_fingerprint(self, database_system: str) -> str:
+        """Hash of the database system account the pipeline connects to, without any secret."""
+        url, connect_args = self.engine_config(database_system)
+        account = {
+            "database_system": database_system,
+            "url": url,
+            **{
+                key: connect_args.get(key)
+                for key in ["account", "host", "user", "role", "database"]
+            },
+        }
+        return hashlib.sha256(json.dumps(account, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def definitions_fingerprint(self) -> str:
+        """Hash of all the parsed definitions, to detect changes since a plan was made."""
+        definitions = json.dumps(self.definitions_index, sort_keys=True, default=str)
+        return hashlib.sha256(definitions.encode()).hexdigest()[:16]
+
+    def engine_arguments(self, database_system: str) -> tuple[str, dict]:
+        """Engine URL and connect arguments of the database system, with the private key decoded to DER.
+
+        The key is decoded here once, the connection manager reuses the
+        arguments for every connection of its pool.
+        """
+        url, connect_args = self.engine_config(database_system)
+
         # Get values for key pair authentification
-        private_key_path: str = db_sys_engine["sqlalchemy.connect_args"].get(
+        private_key_path: str = connect_args.get(
             "private_key_path",
             None,
         )
-        private_key: str = db_sys_engine["sqlalchemy.connect_args"].get(
+        private_key: str = connect_args.get(
             "private_key",
             "",
         )
-        private_key_passphrase: str = db_sys_engine["sqlalchemy.connect_args"].get(
+        private_key_passphrase: str = connect_args.get(
             "private_key_passphrase",
             "",
         )
@@ -274,6 +692,10 @@ class Utils:
             private_key_passphrase = None
 
         p_key = None
+        if private_key_path or private_key:
+            from cryptography.hazmat.backends import default_backend  # noqa: PLC0415
+            from cryptography.hazmat.primitives import serialization  # noqa: PLC0415
+
         if private_key_path:
             with open(private_key_path, "rb") as key_file:
                 p_key = serialization.load_pem_private_key(
@@ -305,6 +727,13 @@ class Utils:
             connect_args.pop("private_key_path", None)
             connect_args.pop("private_key_passphrase", None)
 
+        return url, connect_args
+
+    def create_db_sys_connection(self, database_system: str):
+        """Create SQL connection for query execution."""
+        from sqlalchemy import create_engine  # noqa: PLC0415
+
+        url, connect_args = self.engine_arguments(database_system)
         engine = create_engine(url, connect_args=connect_args, echo=False)
 
         return engine.connect()
@@ -313,20 +742,99 @@ class Utils:
         self,
         conn:Connection,
         sql:str,
-        wait_time:int|None,
+        wait_time:int|None = None,
+        ready_query:str|None = None,
+        node:str|None = None,
     ) -> None:
-        """Execute rendered templates using SQL database connection."""
+        """Execute rendered templates using SQL database connection.
+
+        When the resource has a wait time, the readiness query is polled until
+        the resource is ready, for at most the wait time in seconds.
+        """
+        # Alter templates may render several statements, the drivers execute one at a time.
+        statements = split_statements(sql)
+        for statement in statements:
+            try:
+                conn.exec_driver_sql(statement)
+            except Exception as err:
+                raise SQLExecutionError(
+                    error=err,
+                    sql=statement,
+                    ) from err
+
+        if wait_time:
+            # Show the progress before waiting.
+            self.output.flush()
+            if ready_query:
+                self.wait_until_ready(conn=conn, ready_query=ready_query, timeout=wait_time)
+            else:
+                # Nothing to check the resource with, wait for the whole time.
+                with TRACER.span("wait_time", "wait"):
+                    time.sleep(wait_time)
+
+        self.output.executed(node=node, statements=len(statements))
+
+    def execute_batch(
+        self,
+        conn:Connection,
+        template:str,
+        statements:list[str],
+    ) -> tuple[int, str] | None:
+        """Execute independent statements in a single request, with the batch template of the database system.
+
+        The template gets the list of `statements` and must return 0 when all of
+        them succeeded, otherwise the number of the failed statement, starting
+        from 1, followed by its error.
+
+        Returns:
+            tuple | None: The index in `statements` of the failed statement and its error, None on success.
+
+        """
+        sql = self.template_cache.get(template)[0].render(statements=statements).strip()
         try:
-            conn.exec_driver_sql(sql)
-            if wait_time:
-                time.sleep(wait_time)
+            outcome = conn.exec_driver_sql(sql).scalar()
         except Exception as err:
             raise SQLExecutionError(
                 error=err,
                 sql=sql,
                 ) from err
-        else:
-            self.console.print("[bold green3]\nSQL EXECUTION SUCCESSFULL[/bold green3]")
+
+        step, _, error = str(outcome or 0).partition(" ")
+        if step.isdigit() and int(step) == 0:
+            self.output.executed(statements=len(statements))
+            return None
+        if not step.isdigit() or not 0 < int(step) <= len(statements):
+            raise SQLExecutionError(error=Exception(f"Unexpected batch outcome: {outcome}"), sql=sql)
+        return int(step) - 1, error
+
+    def is_ready(self, conn:Connection, ready_query:str) -> bool:
+        """Run the readiness query once, the resource is ready when it returns a value."""
+        try:
+            row = conn.exec_driver_sql(ready_query).first()
+        except Exception as err:
+            raise SQLExecutionError(
+                error=err,
+                sql=ready_query,
+                ) from err
+        return row is not None and bool(row[0])
+
+    def wait_until_ready(
+        self,
+        conn:Connection,
+        ready_query:str,
+        timeout:float,
+        interval:float = READY_POLL_INTERVAL,
+        max_interval:float = READY_MAX_INTERVAL,
+    ) -> None:
+        """Poll the readiness query with exponential backoff until it succeeds or the timeout is over."""
+        deadline = time.monotonic() + timeout
+        with TRACER.span("wait_until_ready", "wait"):
+            while not self.is_ready(conn=conn, ready_query=ready_query):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ReadinessError(timeout=timeout, sql=ready_query)
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, max_interval)
 
     def zip_python_proc(self, file_path: str):
         """Zip python source code for a procedure in a database."""